@@ -0,0 +1,67 @@
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_builder import build_prompt, count_tokens, note_symptoms, record_reply, record_turn
+
+# Prompt size per turn over one long conversation that keeps landing in the
+# fallback branch: the old prompt (every distinct word ever said plus every
+# open slot) against the bounded context builder.
+
+MESSAGES = [
+    "I've been feeling a bit off since yesterday, kind of tired and nauseous",
+    "It started after dinner, I think it might have been something I ate",
+    "My stomach ache comes and goes, worse in the evening",
+    "No fever as far as I can tell but I did feel dizzy this morning",
+    "I've been drinking water and resting, should I take anything?",
+    "My sister had something similar last week and it lasted a few days",
+    "Is it okay to go to work tomorrow or should I stay home?",
+    "Could I see someone in the afternoon at 3 if it gets worse?",
+    "Also I have trouble sleeping lately, maybe because of stress at work",
+    "What foods should I avoid while my stomach is upset?",
+]
+REPLY = ("I'm sorry you're going through this. Rest, stay hydrated and keep an eye on how you feel; "
+         "if symptoms get worse, please consider booking one of the available slots.")
+
+
+def legacy_prompt(memory, user_input, slots):
+    for word in user_input.split():
+        if word not in memory["symptoms"]:
+            memory["symptoms"].append(word)
+    symptom_part = f"Recent symptoms mentioned: {', '.join(memory['symptoms'])}\n"
+    return (
+        f"{symptom_part}"
+        f"The patient says: '{user_input}'.\n"
+        f"Here are upcoming available appointment slots:\n" + "\n".join(slots) + "\n\n"
+        f"Provide empathetic healthcare advice. Suggest a slot if appropriate. Use the patient's name if known."
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    slots = [f"Monday, January 05, 2026 at {h % 12 or 12:02d}:{m:02d} {'AM' if h < 12 else 'PM'} with Dr. {d}"
+             for h in range(9, 17) for m in (0, 30) for d in ("Smith", "Lee")]
+    legacy_memory, memory = {"symptoms": []}, {"symptoms": []}
+    legacy_total = bounded_total = 0
+    print(f"{'turn':>5} {'legacy tokens':>14} {'bounded tokens':>15}")
+    for turn in range(1, args.turns + 1):
+        message = f"{rng.choice(MESSAGES)} (day {turn})"
+        legacy = count_tokens(legacy_prompt(legacy_memory, message, slots))
+        note_symptoms(memory, message)
+        _, counts = build_prompt(memory, message, slots)
+        record_turn(memory, message)
+        record_reply(memory, REPLY)
+        legacy_total += legacy
+        bounded_total += counts["prompt_tokens"]
+        if turn in (1, 5, 10, 20, 40, args.turns):
+            print(f"{turn:5d} {legacy:14d} {counts['prompt_tokens']:15d}")
+    print(f"total over {args.turns} turns: legacy {legacy_total}, bounded {bounded_total} "
+          f"({100 * (1 - bounded_total / legacy_total):.0f}% fewer prompt tokens)")
+    print(f"symptoms tracked: {', '.join(memory['symptoms'])}")
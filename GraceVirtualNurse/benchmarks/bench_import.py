@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Times `import grace_chatbot_gui` and create_app() in fresh interpreters and
+# fails if either goes over budget or if the import pulls in a subsystem that
+# should only load on first use.
+
+LAZY_MODULES = [
+    "speech_recognition",
+    "pyttsx3",
+    "googleapiclient",
+    "google.oauth2.service_account",
+    "twilio",
+    "requests",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import grace_chatbot_gui
+imported = time.perf_counter()
+loaded = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+grace_chatbot_gui.create_app(scheduler="off")
+created = time.perf_counter()
+print(json.dumps({"import": imported - started, "create_app": created - imported, "loaded": loaded}))
+"""
+
+
+def probe(workdir):
+    env = dict(os.environ, PYTHONPATH=APP_DIR,
+               GRACE_DB_PATH=os.path.join(workdir, "grace.db"))
+    output = subprocess.run([sys.executable, "-c", PROBE, json.dumps(LAZY_MODULES)], cwd=workdir,
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=400, help="max median import time")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    probe(workdir)  # warm the bytecode cache
+    results = [probe(workdir) for _ in range(args.runs)]
+    import_ms = statistics.median(r["import"] for r in results) * 1000
+    create_ms = statistics.median(r["create_app"] for r in results) * 1000
+    loaded = sorted({name for r in results for name in r["loaded"]})
+
+    print(f"import grace_chatbot_gui  median {import_ms:.0f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    print(f"create_app()              median {create_ms:.0f}ms")
+    print(f"lazy modules loaded at import: {', '.join(loaded) or 'none'}")
+    sys.exit(1 if import_ms > args.budget_ms or loaded else 0)
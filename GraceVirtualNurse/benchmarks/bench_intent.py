@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import classify_intent
+
+# Compares the compiled single-pass classifier with the original chained
+# substring checks (confirmation scan + get_user_intent + name/slot regexes)
+# over a corpus of realistic patient messages, and checks they agree.
+
+CORPUS = [
+    "Hi", "hello there", "hey grace", "Hi, my name is Rachel", "My name is Tom",
+    "I have a headache", "I've had a fever since last night", "my throat is sore",
+    "I have a sore throat and chills", "bad cough and chest pain", "my nose is stuffy",
+    "I'd like to book an appointment", "can I get an appointment tomorrow",
+    "please cancel my appointment", "I need to reschedule my appointment",
+    "confirm", "yes", "y", "confirm slot 2", "slot 3 please", "go ahead", "sounds good",
+    "remind me to take my medication", "Atomoxetine 80 mgs, 1 tablet at 8:00 AM every day",
+    "can I have a summary", "what should I do now", "I'm feeling a bit better today",
+    "thank you so much", "is it ok to take paracetamol with food?", "okay sure",
+    # The word after "my name is" is still scanned for keywords.
+    "my name is summary", "My name is Yesenia", "my name is Hilary and I have a cough",
+    "my name is Bookman, confirm slot 2", "my name is", "My name is Sure",
+    # Keywords that share letters are all found.
+    "go aheadache", "yesummary", "surescheduled appointment", "sore throat", "hi-fever",
+]
+# Glued from keyword fragments at random, to catch overlaps nobody thought of.
+FRAGMENTS = ["yes", "sure", "summary", "ahead", "go ", "ache", "head", "re", "schedule", "book", "appoint",
+             "ment", "confirm", "slot ", "2", "my name is ", "hi", " ", "hey", "sore", " throat", "okay",
+             "cancel", "remind", "please do", "sounds good", "medication", "fever", "pain", "y"]
+
+CONFIRMATION_PHRASES = ["yes", "confirm", "book", "go ahead", "okay", "sure", "please do", "sounds good"]
+
+
+def legacy_get_user_intent(user_input):
+    user_input = user_input.lower().strip()
+    if "summary" in user_input:
+        return "summary"
+    if "my name is" in user_input:
+        return "provide_name"
+    symptom_keywords = ["headache", "fever", "cough", "pain", "stuffy", "sore throat", "chills", "sore"]
+    if any(keyword in user_input for keyword in symptom_keywords):
+        return "symptom"
+    greeting_keywords = ["hi", "hello", "hey"]
+    if any(word in user_input.split() for word in greeting_keywords):
+        return "greeting"
+    if "confirm" in user_input or user_input in ["yes", "y"]:
+        return "confirm_booking"
+    if "book" in user_input or "appointment" in user_input:
+        if "cancel" in user_input:
+            return "cancel_appointment"
+        elif "reschedule" in user_input:
+            return "reschedule_appointment"
+        else:
+            return "book_appointment"
+    if "remind" in user_input or "medication" in user_input:
+        return "medication_reminder"
+    return "unknown"
+
+
+def legacy_pipeline(user_input):
+    user_input_lower = user_input.lower()
+    is_confirmation = any(phrase in user_input_lower for phrase in CONFIRMATION_PHRASES)
+    intent = legacy_get_user_intent(user_input)
+    name_match = re.search(r"my name is\s+([a-zA-Z]+)", user_input, re.IGNORECASE)
+    slot_match = re.search(r'slot\s*(\d+)', user_input_lower)
+    name = name_match.group(1).capitalize() if name_match else None
+    slot_number = int(slot_match.group(1)) if slot_match else None
+    return intent, name, slot_number, is_confirmation
+
+
+def compiled_pipeline(user_input):
+    match = classify_intent(user_input)
+    return match.intent, match.name, match.slot_number, match.is_confirmation
+
+
+def timed(fn, messages):
+    started = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for message in CORPUS:
+        assert legacy_pipeline(message) == compiled_pipeline(message), message
+    rng = random.Random(42)
+    for _ in range(20000):
+        message = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 6)))
+        assert legacy_pipeline(message) == compiled_pipeline(message), message
+
+    messages = [rng.choice(CORPUS) for _ in range(args.messages)]
+    legacy = timed(legacy_pipeline, messages)
+    compiled = timed(compiled_pipeline, messages)
+    print(f"{args.messages} messages")
+    print(f"  legacy    {legacy:.3f}s  ({legacy / args.messages * 1e6:.2f} us/message)")
+    print(f"  compiled  {compiled:.3f}s  ({compiled / args.messages * 1e6:.2f} us/message)")
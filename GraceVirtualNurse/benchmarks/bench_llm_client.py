@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import LLMClient, LLMOverloadedError
+from stub_llm_server import start_stub_server
+
+# Measures completions/second through the pooled client against the stub server.
+# With a 200ms stub latency and max_in_flight=16, throughput should approach 80/s.
+
+
+def run(requests_total, concurrency, max_in_flight, latency):
+    server, url = start_stub_server(latency=latency)
+    client = LLMClient(api_key="stub", api_base=url, max_in_flight=max_in_flight, queue_timeout=30)
+    overloaded = 0
+
+    def one(i):
+        nonlocal overloaded
+        try:
+            client.complete(f"I have a headache {i}")
+        except LLMOverloadedError:
+            overloaded += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_total)))
+    elapsed = time.perf_counter() - started
+
+    client.close()
+    server.shutdown()
+    print(f"{requests_total} completions, concurrency={concurrency}, max_in_flight={max_in_flight}")
+    print(f"  elapsed   {elapsed:.2f}s")
+    print(f"  rate      {requests_total / elapsed:.1f} completions/s")
+    print(f"  overloaded {overloaded}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    run(args.requests, args.concurrency, args.max_in_flight, args.latency)
@@ -0,0 +1,75 @@
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Rows per second for onboarding prescriptions: one add_medication call per
+# row (what the chat flow does, one transaction each) against
+# medication_import at a few chunk sizes, from an in-memory CSV.
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="grace-bench-")
+os.environ["GRACE_DB_PATH"] = os.path.join(SCRATCH_DIR, "bench.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_pool
+from medication_import import import_medications, read_records
+from medication_reminder import add_medication, init_medication_db, parse_dose_times, upsert_patient
+
+MEDICATIONS = [("Amoxicillin", "500mg"), ("Metformin", "850mg"), ("Lisinopril", "10mg"), ("Atorvastatin", "20mg")]
+SCHEDULES = ["8:00 AM", "8:00 AM, 8:00 PM", "7am, 1pm, 7pm", "22:00"]
+
+
+def prescriptions_csv(count, rng):
+    lines = ["patient_id,name,dosage,dose_times,duration_days,patient_name,phone"]
+    for i in range(count):
+        name, dosage = rng.choice(MEDICATIONS)
+        lines.append(f'patient-{i % 2000},{name},{dosage},"{rng.choice(SCHEDULES)}",{rng.randint(5, 60)},'
+                     f'Patient {i % 2000},+1555{i % 2000:07d}')
+    return "\n".join(lines) + "\n"
+
+
+def per_row(text):
+    # The chat flow: parse, upsert the patient and insert, one call and commit each.
+    for _, record in read_records(io.StringIO(text), "csv"):
+        upsert_patient(record["patient_id"], name=record["patient_name"], phone=record["phone"])
+        dose_times = parse_dose_times(record["dose_times"])
+        add_medication(record["name"], record["dosage"], len(dose_times), int(record["duration_days"]),
+                       record["dose_times"], patient_id=record["patient_id"], dose_times=dose_times)
+
+
+def reset():
+    get_pool().execute("DELETE FROM medications")
+    get_pool().execute("DELETE FROM patients")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--per-row-rows", type=int, default=5000, help="rows for the slow per-row baseline")
+    parser.add_argument("--chunk-sizes", default="100,1000,10000")
+    args = parser.parse_args()
+
+    init_medication_db()
+    rng = random.Random(3)
+    print(f"{'method':26s} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+
+    text = prescriptions_csv(args.per_row_rows, rng)
+    started = time.perf_counter()
+    per_row(text)
+    elapsed = time.perf_counter() - started
+    print(f"{'add_medication per row':26s} {args.per_row_rows:8d} {elapsed:9.2f} {args.per_row_rows / elapsed:10.0f}")
+
+    text = prescriptions_csv(args.rows, rng)
+    for chunk_size in (int(size) for size in args.chunk_sizes.split(",")):
+        reset()
+        started = time.perf_counter()
+        result = import_medications(read_records(io.StringIO(text), "csv"), chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        assert result.imported == args.rows and not result.rejected
+        print(f"{f'import, chunks of {chunk_size}':26s} {result.imported:8d} {elapsed:9.2f} "
+              f"{result.imported / elapsed:10.0f}")
+    count = get_pool().query_one("SELECT COUNT(*) FROM medications")[0]
+    print(f"{count} prescriptions in the database after the last run")
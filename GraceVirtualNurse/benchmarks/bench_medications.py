@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Populates a scratch database with mostly finished prescriptions plus a fixed
+# number of active ones, then times get_today_medications at each size next to
+# the old approach (fetch every row, filter in Python). The indexed query
+# should stay flat as the history grows.
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="grace-bench-")
+os.environ["GRACE_DB_PATH"] = os.path.join(SCRATCH_DIR, "bench.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_pool
+from medication_reminder import INSERT_MEDICATION, get_today_medications, init_medication_db
+
+ACTIVE_ROWS = 500
+PATIENTS = 5000
+
+
+def legacy_get_today_medications(today):
+    reminders = []
+    for name, dosage, times, start_str, duration in get_pool().query(
+            "SELECT name, dosage, times_per_day, start_date, duration_days FROM medications"):
+        start = date.fromisoformat(start_str)
+        if start <= today <= start + timedelta(days=duration):
+            reminders.append(f"Take {dosage} of {name} - {times} times today")
+    return reminders
+
+
+def rows(count, today, rng, active):
+    for _ in range(count):
+        duration = rng.randint(5, 30)
+        if active:
+            start = today - timedelta(days=rng.randint(0, duration))
+        else:
+            start = today - timedelta(days=rng.randint(duration + 1, 3650))
+        end = start + timedelta(days=duration)
+        yield ("Amoxicillin", "500mg", 3, start.isoformat(), duration, "",
+               end.isoformat(), f"patient-{rng.randrange(PATIENTS)}", "08:00")
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--skip-legacy-above", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    init_medication_db()
+    pool = get_pool()
+    rng = random.Random(7)
+    today = date.today()
+    pool.executemany(INSERT_MEDICATION, rows(ACTIVE_ROWS, today, rng, active=True))
+    total = ACTIVE_ROWS
+
+    print(f"{'rows':>10} {'indexed':>12} {'per patient':>12} {'legacy':>12}")
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        pool.executemany(INSERT_MEDICATION, rows(size - total, today, rng, active=False))
+        total = size
+
+        indexed, active = timed(lambda: get_today_medications(day=today))
+        per_patient, _ = timed(lambda: get_today_medications(patient_id="patient-42", day=today))
+        assert len(active) == ACTIVE_ROWS
+        if size <= args.skip_legacy_above:
+            legacy, _ = timed(lambda: legacy_get_today_medications(today), repeat=1)
+            legacy_text = f"{legacy * 1000:10.2f}ms"
+        else:
+            legacy_text = f"{'skipped':>12}"
+        print(f"{size:>10} {indexed * 1000:10.2f}ms {per_patient * 1000:10.3f}ms {legacy_text}")
@@ -0,0 +1,74 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cost of the tracing layer per call, with GRACE_METRICS on and off: a bare
+# span, a traced function against the plain one, a counter increment, and
+# one /metrics render. Each mode runs in its own interpreter because the
+# flag is read at import.
+
+
+def measure(iterations):
+    import metrics
+
+    @metrics.traced("bench")
+    def traced():
+        return None
+
+    def plain():
+        return None
+
+    def per_call(func):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) / iterations * 1e9
+
+    def bare_span():
+        with metrics.span("bench"):
+            pass
+
+    counter = metrics.registry.counter("bench_total", "Benchmark counter.", ("kind",))
+    trace = metrics.start_trace("bench")
+    results = {
+        "span": per_call(bare_span),
+        "traced call": per_call(traced),
+        "plain call": per_call(plain),
+        "counter inc": per_call(lambda: counter.inc(1, "a")),
+    }
+    metrics.finish_trace(trace, "bench", 200)
+    for stage in range(20):
+        metrics.STAGE_SECONDS.observe(0.01, f"stage{stage}")
+    started = time.perf_counter()
+    metrics.registry.render()
+    results["render"] = (time.perf_counter() - started) * 1e9
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        for name, nanoseconds in measure(args.iterations).items():
+            print(f"{name}\t{nanoseconds}")
+        sys.exit(0)
+
+    rows = {}
+    for flag in ("1", "0"):
+        output = subprocess.run([sys.executable, __file__, "--child", "--iterations", str(args.iterations)],
+                                env=dict(os.environ, GRACE_METRICS=flag), capture_output=True, text=True,
+                                check=True).stdout
+        for line in output.splitlines():
+            name, nanoseconds = line.split("\t")
+            rows.setdefault(name, {})[flag] = float(nanoseconds)
+    print(f"{'per call':14s} {'enabled':>12} {'disabled':>12}")
+    for name, values in rows.items():
+        unit, scale = ("us", 1000) if name == "render" else ("ns", 1)
+        print(f"{name:14s} {values['1'] / scale:9.0f} {unit} {values['0'] / scale:9.0f} {unit}")
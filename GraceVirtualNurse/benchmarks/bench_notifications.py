@@ -0,0 +1,62 @@
+import argparse
+import os
+import smtplib
+import sys
+import time
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifications import HTTPSMSTransport, NotificationService, SMTPTransport
+from stub_notification_servers import start_sms_server, start_smtp_server
+
+# Sends a bulk reminder run through the local SMTP/SMS stubs twice: once the
+# old way (new SMTP connection per email, inline) and once through the pooled
+# NotificationService.
+
+
+def legacy_send_email(port, to_email, subject, body):
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = "grace@example.com"
+    msg["To"] = to_email
+    with smtplib.SMTP("127.0.0.1", port) as server:
+        server.sendmail("grace@example.com", to_email, msg.as_string())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub time per message")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    _, smtp_port, smtp_counters = start_smtp_server(latency=args.latency)
+    _, sms_url, sms_counters = start_sms_server(latency=args.latency)
+    emails = [(f"patient{i}@example.com", "Your Medication Reminder", "Please take 500mg of Amoxicillin.")
+              for i in range(args.messages)]
+    texts = [(f"+6421000{i:04d}", "Please take 500mg of Amoxicillin.") for i in range(args.messages)]
+
+    started = time.perf_counter()
+    for to_email, subject, body in emails:
+        legacy_send_email(smtp_port, to_email, subject, body)
+    legacy = time.perf_counter() - started
+    legacy_connections = smtp_counters.connections
+
+    service = NotificationService(
+        email_transport=SMTPTransport(host="127.0.0.1", port=smtp_port, use_ssl=False,
+                                      username="grace@example.com", password=""),
+        sms_transport=HTTPSMSTransport(url=sms_url),
+        workers=args.workers,
+    )
+    started = time.perf_counter()
+    email_results = service.email_bulk(emails)
+    sms_results = service.sms_bulk(texts)
+    pooled = time.perf_counter() - started
+    service.close()
+
+    errors = [r for r in email_results + sms_results if isinstance(r, Exception)]
+    print(f"{args.messages} emails + {args.messages} SMS, {args.latency * 1000:.0f}ms stub latency")
+    print(f"  legacy emails only  {legacy:.2f}s  ({legacy_connections} SMTP connections)")
+    print(f"  pooled email + SMS  {pooled:.2f}s  "
+          f"({smtp_counters.connections - legacy_connections} SMTP connections, {len(errors)} errors)")
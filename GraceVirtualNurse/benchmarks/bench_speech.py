@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speech_worker import SpeechWorker
+
+# Speaks a reminder run through a fake engine with pyttsx3-like costs: once the
+# old way (init + runAndWait per call, on the caller's thread) and once through
+# SpeechWorker, with and without the WAV cache. No audio device is needed.
+
+
+class FakeEngine:
+    def __init__(self, init_cost, seconds_per_char):
+        time.sleep(init_cost)
+        self.seconds_per_char = seconds_per_char
+        self.pending = []
+        self.synthesized = 0
+
+    def setProperty(self, name, value):
+        pass
+
+    def say(self, text):
+        self.pending.append((text, None))
+
+    def save_to_file(self, text, filename):
+        self.pending.append((text, filename))
+
+    def runAndWait(self):
+        for text, filename in self.pending:
+            time.sleep(len(text) * self.seconds_per_char)
+            self.synthesized += 1
+            if filename:
+                with wave.open(filename, "wb") as out:
+                    out.setnchannels(1)
+                    out.setsampwidth(2)
+                    out.setframerate(16000)
+                    out.writeframes(b"\0\0" * 160)
+        self.pending = []
+
+
+def legacy_speak(text, init_cost, seconds_per_char):
+    engine = FakeEngine(init_cost, seconds_per_char)
+    engine.say(text)
+    engine.runAndWait()
+
+
+def run_worker(texts, engine, cache_dir):
+    worker = SpeechWorker(engine_factory=lambda: engine, max_queue=len(texts), cache_dir=cache_dir,
+                          player=lambda path: None)
+    started = time.perf_counter()
+    futures = [worker.say(text) for text in texts]
+    caller = time.perf_counter() - started
+    for future in futures:
+        future.result()
+    total = time.perf_counter() - started
+    worker.close()
+    return caller, total, worker.stats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=50)
+    parser.add_argument("--distinct", type=int, default=5, help="distinct reminder texts")
+    parser.add_argument("--init-cost", type=float, default=0.05, help="seconds per engine init")
+    parser.add_argument("--seconds-per-char", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    texts = [f"Reminder: Please take 500mg of Medication {i % args.distinct} now."
+             for i in range(args.reminders)]
+
+    started = time.perf_counter()
+    for text in texts:
+        legacy_speak(text, args.init_cost, args.seconds_per_char)
+    legacy = time.perf_counter() - started
+
+    live_engine = FakeEngine(args.init_cost, args.seconds_per_char)
+    caller, total, _ = run_worker(texts, live_engine, None)
+
+    cached_engine = FakeEngine(args.init_cost, args.seconds_per_char)
+    cached_caller, cached_total, stats = run_worker(texts, cached_engine, tempfile.mkdtemp())
+
+    print(f"{args.reminders} reminders, {args.distinct} distinct texts")
+    print(f"  legacy per-call engine  caller blocked {legacy * 1000:.0f}ms, {args.reminders} engine inits")
+    print(f"  speech worker           caller blocked {caller * 1000:.1f}ms, drained in {total * 1000:.0f}ms, "
+          f"{live_engine.synthesized} syntheses")
+    print(f"  speech worker + cache   caller blocked {cached_caller * 1000:.1f}ms, drained in "
+          f"{cached_total * 1000:.0f}ms, {cached_engine.synthesized} syntheses, "
+          f"{stats['cache_hits']} cache hits")
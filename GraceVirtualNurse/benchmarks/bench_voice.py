@@ -0,0 +1,117 @@
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_pipeline import SAMPLE_RATE, ChunkedBackend, EnergyVAD, VoicePipeline, WavSource, create_speech_backend
+
+# Replays recorded utterances in real time and measures how long after the
+# patient stops talking the final transcript is ready, plus time to the
+# first partial. "listen-then-recognize" mimics the old listen_to_user
+# (0.8s pause threshold, whole utterance sent at the end); "streaming"
+# uses VoicePipeline's chunked recognition. Without --backend the recognizer
+# is simulated with cloud-like latency, so no network or model is needed.
+
+
+def synthesize_utterance(path, speech_seconds, seed):
+    # Syllable-like bursts of a voiced tone over low noise, with silence either side.
+    rng = random.Random(seed)
+    samples = array("h")
+    for _ in range(int(0.5 * SAMPLE_RATE)):
+        samples.append(rng.randint(-60, 60))
+    elapsed = 0.0
+    while elapsed < speech_seconds:
+        burst, gap = rng.uniform(0.15, 0.35), rng.uniform(0.03, 0.12)
+        pitch = rng.uniform(110, 220)
+        for i in range(int(burst * SAMPLE_RATE)):
+            envelope = math.sin(math.pi * i / (burst * SAMPLE_RATE))
+            samples.append(int(6000 * envelope * math.sin(2 * math.pi * pitch * i / SAMPLE_RATE)))
+        for _ in range(int(gap * SAMPLE_RATE)):
+            samples.append(rng.randint(-60, 60))
+        elapsed += burst + gap
+    for _ in range(int(1.5 * SAMPLE_RATE)):
+        samples.append(rng.randint(-60, 60))
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(samples.tobytes())
+
+
+def speech_end(path):
+    # Offset in seconds of the last voiced frame, found offline with the same VAD.
+    source = WavSource(path)
+    vad = EnergyVAD(frame_ms=source.frame_ms)
+    last = 0
+    for index, frame in enumerate(source):
+        if vad.is_speech(frame):
+            last = index + 1
+    return last * source.frame_ms / 1000
+
+
+def simulated_recognize(pcm, sample_rate):
+    # Round trip plus processing time proportional to the audio length.
+    seconds = len(pcm) / 2 / sample_rate
+    time.sleep(0.25 + 0.15 * seconds)
+    return " ".join(["word"] * max(1, int(seconds * 2.5)))
+
+
+def replay(path, backend, end_ms):
+    source = WavSource(path, realtime=True)
+    vad = EnergyVAD(frame_ms=source.frame_ms, end_ms=end_ms)
+    started = time.perf_counter()
+    first_partial = final_at = None
+    for kind, text in VoicePipeline(source, backend, vad).events():
+        if kind == "partial" and first_partial is None:
+            first_partial = time.perf_counter() - started
+        if kind == "final":
+            final_at = time.perf_counter() - started
+            break
+    return first_partial, final_at - speech_end(path)
+
+
+def make_backend(name, whole_utterance):
+    backend = create_speech_backend(name) if name else ChunkedBackend(recognize=simulated_recognize)
+    if whole_utterance and isinstance(backend, ChunkedBackend):
+        backend.chunk_bytes = float("inf")  # one request once the patient stops, like recognizer.listen()
+    return backend
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wavs", nargs="*", help="16-bit mono WAV recordings (synthesized if omitted)")
+    parser.add_argument("--backend", choices=["google", "vosk"], help="real recognizer instead of the simulation")
+    args = parser.parse_args()
+
+    wavs = args.wavs
+    if not wavs:
+        workdir = tempfile.mkdtemp()
+        wavs = []
+        for seed, seconds in enumerate((2.0, 3.5, 5.0)):
+            path = os.path.join(workdir, f"utterance{seed}.wav")
+            synthesize_utterance(path, seconds, seed)
+            wavs.append(path)
+
+    modes = {
+        "listen-then-recognize": (True, 800),
+        "streaming": (False, 500),
+    }
+    for mode, (whole_utterance, end_ms) in modes.items():
+        finals, partials = [], []
+        for path in wavs:
+            backend = make_backend(args.backend, whole_utterance)
+            first_partial, final_latency = replay(path, backend, end_ms)
+            finals.append(final_latency)
+            if first_partial is not None:
+                partials.append(first_partial)
+        first = f"{statistics.mean(partials):.2f}s" if partials else "none"
+        print(f"{mode:22s} end-of-speech -> final transcript  mean {statistics.mean(finals):.2f}s  "
+              f"max {max(finals):.2f}s   first partial {first}")
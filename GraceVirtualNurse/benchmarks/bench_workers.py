@@ -0,0 +1,149 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_llm_server import start_stub_server
+
+# Throughput of serve.py as the worker count grows. Each run starts the
+# server with N workers on a fresh shared store, checks that a patient's
+# session survives being answered by different workers, then drives /chat
+# from client processes on keep-alive connections for a fixed time. Scaling
+# is only meaningful with at least as many idle cores as workers plus
+# clients; on a small box, run the clients elsewhere or read the efficiency
+# column with that in mind.
+
+SERVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "serve.py")
+CONVERSATION = ["Hello", "My name is Ann", "I have a headache", "Can I get a summary?",
+                "Please cancel my appointment"]
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def post(connection, message, session_id):
+    connection.request("POST", "/chat", body=json.dumps({"message": message, "session_id": session_id}),
+                       headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def start_server(workers, port, llm_url, server):
+    workdir = tempfile.mkdtemp(prefix="grace-workers-")
+    env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_API_BASE=llm_url,
+               GRACE_DB_PATH=os.path.join(workdir, "grace.db"),
+               GRACE_SESSION_DB=os.path.join(workdir, "sessions.db"),
+               GRACE_SCHEDULER_LOCK=os.path.join(workdir, "scheduler.lock"),
+               GRACE_RATE_LIMIT_PER_MINUTE="0")  # every client connects from loopback
+    process = subprocess.Popen([sys.executable, SERVE, "--host", "127.0.0.1", "--port", str(port),
+                                "--workers", str(workers), "--server", server],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            post(connection, "Hello", "probe")
+            connection.close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"serve.py did not come up with {workers} workers")
+
+
+def session_continuity(port, patients=20):
+    # Every request on a new connection, so consecutive turns land on whichever worker accepts.
+    kept = 0
+    for patient in range(patients):
+        session_id = f"continuity-{patient}"
+        name = "Zed" + "abcdefghijklmnopqrstuvwxyz"[patient % 26]
+        for message in (f"My name is {name}", "Can I get a summary?"):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            _, body = post(connection, message, session_id)
+            connection.close()
+        kept += name in body["response"]
+    return kept, patients
+
+
+def client(port, seconds, client_id, results):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors, conversation = [], 0, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        conversation += 1
+        for message in CONVERSATION:
+            started = time.perf_counter()
+            try:
+                status, _ = post(connection, message, f"client{client_id}-{conversation}")
+                ok = status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+    results.put((latencies, errors))
+
+
+def drive(port, clients, seconds):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(port, seconds, i, results)) for i in range(clients)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies += client_latencies
+        errors += client_errors
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        "errors": errors,
+    }
+
+
+if __name__ == '__main__':
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= max(cores, 1)) or "1")
+    parser.add_argument("--clients", type=int, default=0, help="client processes (default: 2 per worker)")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--server", choices=["auto", "gunicorn", "prefork"], default="auto")
+    args = parser.parse_args()
+
+    _, llm_url = start_stub_server(latency=args.llm_latency)
+    print(f"{cores} CPU cores")
+    print(f"{'workers':>7} {'clients':>7} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'speedup':>7} "
+          f"{'efficiency':>10} {'sessions kept':>13} {'errors':>6}")
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(",")):
+        port = free_port()
+        server = start_server(workers, port, llm_url, args.server)
+        try:
+            kept, patients = session_continuity(port)
+            drive(port, args.clients or 2 * workers, 1)  # warm every worker's caches and connections
+            result = drive(port, args.clients or 2 * workers, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or result["rps"] / workers
+        speedup = result["rps"] / baseline
+        print(f"{workers:7d} {args.clients or 2 * workers:7d} {result['rps']:8.0f} {result['p50_ms']:7.1f} "
+              f"{result['p95_ms']:7.1f} {speedup:6.2f}x {speedup / workers * 100:9.0f}% "
+              f"{f'{kept}/{patients}':>13} {result['errors']:6d}")
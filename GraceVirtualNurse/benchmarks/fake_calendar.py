@@ -0,0 +1,91 @@
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+from calendar_availability import SyncTokenExpired
+
+# In-memory stand-in for the Calendar API, shaped like GoogleCalendarBackend:
+# list_events() returns (events, next_sync_token) and honours sync tokens, so
+# AvailabilityIndex can be exercised without Google credentials.
+
+
+class FakeCalendarBackend:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._events = {}     # (calendar_id, event id) -> (version, event)
+        self._ids = itertools.count(1)
+        self._version = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _bump(self):
+        self._version += 1
+        return self._version
+
+    def insert(self, calendar_id, start, minutes=30, summary="Busy"):
+        with self._lock:
+            event_id = f"evt{next(self._ids)}"
+            event = {
+                "id": event_id,
+                "status": "confirmed",
+                "summary": summary,
+                "start": {"dateTime": start.isoformat()},
+                "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+            }
+            self._events[(calendar_id, event_id)] = (self._bump(), event)
+            return event
+
+    def cancel(self, calendar_id, event_id):
+        with self._lock:
+            self._events[(calendar_id, event_id)] = (self._bump(), {"id": event_id, "status": "cancelled"})
+
+    def expire_sync_tokens(self):
+        # Makes the next incremental list fail the way Google's 410 Gone does.
+        with self._lock:
+            self._generation += 1
+
+    def list_events(self, calendar_id, time_min=None, sync_token=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            since = 0
+            if sync_token:
+                generation, since = map(int, sync_token.split(":"))
+                if generation != self._generation:
+                    raise SyncTokenExpired(calendar_id)
+            events = [event for (cal, _), (version, event) in self._events.items()
+                      if cal == calendar_id and version > since
+                      and (sync_token or event.get("status") != "cancelled")]
+            return events, f"{self._generation}:{self._version}"
+
+
+class FakeCalendarClient:
+    # Stands in for calendar_client.CalendarClient; inserted events land in the
+    # fake backend, so the availability index sees them on its next sync.
+
+    def __init__(self, backend, latency=0.0):
+        self.backend = backend
+        self.latency = latency
+        self.inserts = 0
+        self._lock = threading.Lock()
+
+    def service(self):
+        raise NotImplementedError("FakeCalendarClient has no discovery service")
+
+    def _insert(self, calendar_id, event):
+        start = datetime.fromisoformat(event["start"]["dateTime"])
+        end = datetime.fromisoformat(event["end"]["dateTime"])
+        with self._lock:
+            self.inserts += 1
+        return self.backend.insert(calendar_id, start, int((end - start).total_seconds() // 60),
+                                   event.get("summary", "Busy"))
+
+    def insert_event(self, calendar_id, event):
+        time.sleep(self.latency)
+        return self._insert(calendar_id, event)
+
+    def insert_events(self, calendar_id, events):
+        time.sleep(self.latency)  # one batched round-trip
+        return [self._insert(calendar_id, event) for event in events]
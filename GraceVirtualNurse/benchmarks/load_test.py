@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_llm_server import start_stub_server
+from stub_notification_servers import start_sms_server, start_smtp_server
+
+# Drives /chat over real HTTP with concurrent virtual patients, each running
+# multi-turn scripts that cover every intent branch, against local stubs for
+# OpenAI, Google Calendar, SMTP and SMS. Reports latency percentiles and
+# throughput overall and per script step, a per-stage breakdown from the
+# Server-Timing headers, and can save the run as a JSON baseline or compare
+# against one:
+#   python load_test.py --out baseline.json
+#   python load_test.py --compare load_test_baseline.json
+
+SYMPTOMS = [
+    "I have a headache and a fever",
+    "I've had a cough and a sore throat since Monday",
+    "I feel feverish with chills tonight",
+    "My headache is getting worse",
+    "I have a stuffy nose and a cough",
+]
+QUESTIONS = [
+    "What should I eat when my stomach is upset?",
+    "Is it okay to go for a walk today?",
+    "How much water should I be drinking?",
+    "Could I see someone in the afternoon at 3 if it gets worse?",
+]
+NAMES = ["Ann", "Ben", "Cara", "Dev", "Ema", "Finn", "Gus", "Hana"]
+
+
+def patient_script(rng):
+    # (step name, request body) in conversation order; every intent branch is visited.
+    return [
+        ("greeting", {"message": "Hello"}),
+        ("provide_name", {"message": f"My name is {rng.choice(NAMES)}"}),
+        ("voice_partial", {"message": "I have a head", "partial": True}),
+        ("symptom", {"message": rng.choice(SYMPTOMS)}),
+        ("fallback", {"message": rng.choice(QUESTIONS)}),
+        ("book_appointment", {"message": "I'd like to book an appointment"}),
+        ("confirm_booking", {"message": f"Confirm slot {rng.randint(1, 4)}"}),
+        ("medication_start", {"message": "Can you set a medication reminder?"}),
+        ("medication_details", {"message": "Amoxicillin 500mg medication, 1 tablet at 8:00 AM every day"}),
+        ("medication_confirm", {"message": "Yes, set the reminder"}),
+        ("reschedule_appointment", {"message": "Can I reschedule my appointment?"}),
+        ("cancel_appointment", {"message": "Please cancel my appointment"}),
+        ("summary", {"message": "Can I get a summary?"}),
+        ("fallback_stream", {"message": rng.choice(QUESTIONS), "stream": True}),
+    ]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def parse_server_timing(header):
+    # "intent;dur=0.05, generate_response;dur=101.2" -> {"intent": 0.00005, ...} in seconds
+    stages = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur=") and name != "total":
+            stages[name] = float(params[len("dur="):]) / 1000
+    return stages
+
+
+def start_stack(args):
+    # Stubs first, then the app configured to use them, served over HTTP.
+    _, llm_url = start_stub_server(latency=args.llm_latency)
+    _, smtp_port, smtp_counters = start_smtp_server(latency=args.notify_latency)
+    _, sms_url, sms_counters = start_sms_server(latency=args.notify_latency)
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "OPENAI_API_KEY": "stub", "OPENAI_API_BASE": llm_url,
+        "GRACE_SMTP_HOST": "127.0.0.1", "GRACE_SMTP_PORT": str(smtp_port), "GRACE_SMTP_SSL": "0",
+        "EMAIL_ADDRESS": "grace@example.com",
+        "GRACE_SMS_BACKEND": "http", "GRACE_SMS_URL": sms_url,
+        "GRACE_DB_PATH": os.path.join(workdir, "grace.db"),
+        "GRACE_SESSION_DB": os.path.join(workdir, "sessions.db"),
+        "GRACE_SCHEDULER_LOCK": os.path.join(workdir, "scheduler.lock"),
+        "GRACE_SCHEDULER": "off",
+        "GRACE_RATE_LIMIT_PER_MINUTE": "0",  # every simulated patient connects from loopback
+        "GRACE_DOCTOR_CALENDARS": json.dumps({f"Dr. Doctor{i}": f"doctor{i}" for i in range(args.doctors)}),
+    })
+    os.chdir(workdir)
+
+    # Imported only now: these modules read their configuration from the environment at import.
+    import grace_chatbot_gui as app_module
+    from fake_calendar import FakeCalendarBackend, FakeCalendarClient
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    calendar = FakeCalendarBackend(latency=args.calendar_latency)
+    app_module.availability.backend = calendar
+    app_module.calendar_client = FakeCalendarClient(calendar, latency=args.calendar_latency)
+    app = app_module.create_app(scheduler="off")
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backends = {"calendar": calendar, "calendar_client": app_module.calendar_client,
+                "smtp": smtp_counters, "sms": sms_counters}
+    return f"http://127.0.0.1:{server.server_port}", app_module, backends
+
+
+def run_patient(base_url, user, iterations, record, seed):
+    import requests
+    rng = random.Random(seed)
+    session = requests.Session()
+    for iteration in range(iterations):
+        session_id = f"load-{user}-{iteration}"
+        for step, body in patient_script(rng):
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/chat", json=dict(body, session_id=session_id),
+                                        stream=bool(body.get("stream")), timeout=60)
+                for _ in response.iter_content(chunk_size=None):
+                    pass
+                ok = response.status_code == 200
+                stages = parse_server_timing(response.headers.get("Server-Timing", ""))
+            except Exception:
+                ok, stages = False, {}
+            record(step, time.perf_counter() - started, ok, stages)
+    session.close()
+
+
+def run(args):
+    base_url, app_module, backends = start_stack(args)
+    samples = defaultdict(list)
+    stage_samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def record(step, elapsed, ok, stages):
+        with lock:
+            samples[step].append(elapsed)
+            for stage, seconds in stages.items():
+                stage_samples[stage].append(seconds)
+            if not ok:
+                errors[step] += 1
+
+    if args.warmup:
+        run_patient(base_url, "warmup", 1, lambda *a: None, seed=0)
+    samples.clear()
+    stage_samples.clear()
+
+    threads = [threading.Thread(target=run_patient, args=(base_url, user, args.iterations, record, args.seed + user))
+               for user in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    every = [value for values in samples.values() for value in values]
+    return {
+        "version": 1,
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {key: getattr(args, key) for key in
+                   ("users", "iterations", "llm_latency", "calendar_latency", "notify_latency", "doctors", "seed")},
+        "overall": dict(summarize(every), requests=len(every), errors=sum(errors.values()),
+                        duration_s=round(elapsed, 3), rps=round(len(every) / elapsed, 2)),
+        "steps": {step: dict(summarize(values), errors=errors[step]) for step, values in samples.items()},
+        "stages": {stage: summarize(values) for stage, values in stage_samples.items()},
+        "backends": {
+            "calendar_list_calls": backends["calendar"].calls,
+            "calendar_inserts": backends["calendar_client"].inserts,
+            "emails": backends["smtp"].messages,
+            "smtp_connections": backends["smtp"].connections,
+            "sms": backends["sms"].messages,
+            "llm_latency": app_module.get_llm_client().latency.snapshot(),
+        },
+    }
+
+
+def print_report(result):
+    overall = result["overall"]
+    print(f"{overall['requests']} requests from {result['config']['users']} patients in {overall['duration_s']}s "
+          f"-> {overall['rps']} req/s, {overall['errors']} errors")
+    print(f"{'step':24s} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for step, stats in list(result["steps"].items()) + [("overall", overall)]:
+        print(f"{step:24s} {stats['count']:6d} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['p99_ms']:8.1f} {stats['errors']:7d}")
+    if result.get("stages"):
+        print(f"\n{'stage (server side)':24s} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for stage, stats in result["stages"].items():
+            print(f"{stage:24s} {stats['count']:6d} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}")
+    backends = result["backends"]
+    print(f"backends: {backends['calendar_list_calls']} calendar syncs, {backends['calendar_inserts']} inserts, "
+          f"{backends['emails']} emails over {backends['smtp_connections']} SMTP connections, {backends['sms']} SMS")
+
+
+def compare(result, baseline, tolerance):
+    # Flags any step whose p95 grew by more than tolerance (a fraction) over the baseline.
+    regressions = []
+    print(f"\n{'step':24s} {'base p95':>9} {'now p95':>9} {'change':>8}")
+    rows = [(step, baseline["steps"].get(step), stats) for step, stats in result["steps"].items()]
+    rows.append(("overall", baseline["overall"], result["overall"]))
+    for step, before, now in rows:
+        if not before:
+            continue
+        change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(step)
+            flag = "  REGRESSION"
+        print(f"{step:24s} {before['p95_ms']:9.1f} {now['p95_ms']:9.1f} {change * 100:+7.0f}%{flag}")
+    throughput = (result["overall"]["rps"] - baseline["overall"]["rps"]) / baseline["overall"]["rps"]
+    print(f"throughput {baseline['overall']['rps']} -> {result['overall']['rps']} req/s ({throughput * 100:+.0f}%)")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test for Grace's /chat endpoint")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual patients")
+    parser.add_argument("--iterations", type=int, default=3, help="scripts per patient")
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--calendar-latency", type=float, default=0.05)
+    parser.add_argument("--notify-latency", type=float, default=0.01)
+    parser.add_argument("--doctors", type=int, default=10, help="doctor calendars (16 slots each)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--out", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth before failing")
+    args = parser.parse_args()
+    args.out = args.out and os.path.abspath(args.out)
+    args.compare = args.compare and os.path.abspath(args.compare)
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(result, out, indent=2)
+        print(f"baseline written to {args.out}")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.tolerance)
+        sys.exit(1 if regressions or result["overall"]["errors"] else 0)
+    sys.exit(1 if result["overall"]["errors"] else 0)
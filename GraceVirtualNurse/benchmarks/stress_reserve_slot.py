@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Patients race through reserve_slot itself (hold, confirm, calendar insert)
+# against the fake calendar, with holds short enough to lapse while a slow
+# request is still running and some calendar inserts failing. Checked after
+# each round: every slot has at most one event, there is exactly one event per
+# patient told "confirmed", every confirmed reservation has its event (and none
+# is left half-booked), and no
+# patient whose event was written is told the slot was lost.
+
+WORKDIR = tempfile.mkdtemp(prefix="grace-reserve-")
+os.environ.update({
+    "OPENAI_API_KEY": "stub",
+    "GRACE_DB_PATH": os.path.join(WORKDIR, "grace.db"),
+    "GRACE_SESSION_DB": os.path.join(WORKDIR, "sessions.db"),
+    "GRACE_SCHEDULER": "off",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grace_chatbot_gui as app_module
+from calendar_availability import AvailabilityIndex
+from db import get_pool
+from fake_calendar import FakeCalendarBackend, FakeCalendarClient
+from slot_reservations import SlotReservations
+
+
+class SlowReservations(SlotReservations):
+    # Some requests stall between the hold and the confirm, long enough for the hold to lapse.
+
+    def confirm(self, calendar_id, slot_start, holder, version):
+        time.sleep(random.uniform(0, 2 * self.hold_seconds))
+        return super().confirm(calendar_id, slot_start, holder, version)
+
+
+class FlakyCalendarClient(FakeCalendarClient):
+    # Fails a share of inserts after the round-trip, and remembers which patient each event is for.
+
+    def __init__(self, backend, latency, failure_rate):
+        super().__init__(backend, latency)
+        self.failure_rate = failure_rate
+        self.written_for = set()
+        self.local = threading.local()
+
+    def insert_event(self, calendar_id, event):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("calendar insert failed")
+        created = self._insert(calendar_id, event)
+        with self._lock:
+            self.written_for.add(self.local.patient)
+        return created
+
+
+def patient(client, patient_id, barrier):
+    # Half the patients pick a slot (and hold it) before confirming; the rest
+    # confirm straight from the list.
+    memory = {}
+    app_module.offer_slots(memory, patient_id)
+    slot_index = random.randrange(len(memory["slot_choices"]))
+    client.local.patient = patient_id
+    barrier.wait()
+    if random.random() < 0.5:
+        app_module.hold_slot(slot_index, memory, patient_id)
+    return patient_id, app_module.reserve_slot(slot_index, memory, patient_id)
+
+
+def run_round(number, args):
+    get_pool().execute("DELETE FROM slot_reservations")
+    calendar = FakeCalendarBackend()
+    client = FlakyCalendarClient(calendar, args.insert_latency, args.failure_rate)
+    app_module.calendar_client = client
+    app_module.availability = AvailabilityIndex(calendar, ttl=0)
+    barrier = threading.Barrier(args.patients)
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.patients) as executor:
+        futures = [executor.submit(patient, client, f"r{number}-p{i}", barrier) for i in range(args.patients)]
+        replies = dict(future.result() for future in futures)
+
+    events, _ = calendar.list_events("primary")
+    per_slot = Counter(event["start"]["dateTime"] for event in events)
+    confirmed = {patient_id for patient_id, reply in replies.items() if "is confirmed" in reply}
+    lost = {patient_id for patient_id, reply in replies.items() if "taken" in reply}
+    reserved = set(get_pool().query("SELECT holder FROM slot_reservations WHERE status = 'confirmed'"))
+    unfinished = get_pool().query("SELECT holder FROM slot_reservations WHERE status = 'booking'")
+
+    assert max(per_slot.values(), default=0) <= 1, f"double-booked: {per_slot.most_common(1)}"
+    assert len(events) == len(confirmed) == client.inserts, "calendar events disagree with confirmed replies"
+    assert client.written_for == confirmed, "an event was written for a patient not told it was booked"
+    assert not client.written_for & lost, "a patient was told the slot was lost after its event was written"
+    assert {holder for (holder,) in reserved} == confirmed, "a failed insert left its reservation confirmed"
+    assert not unfinished, "a booking was left between confirm and complete"
+    return Counter("confirmed" if p in confirmed else "lost" if p in lost else "insert failed" for p in replies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--patients", type=int, default=48, help="concurrent patients per round")
+    parser.add_argument("--hold-seconds", type=float, default=0.2)
+    parser.add_argument("--insert-latency", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of calendar inserts that fail")
+    args = parser.parse_args()
+
+    app_module.notify = lambda *args, **kwargs: None
+    app_module.slot_reservations = SlowReservations(hold_seconds=args.hold_seconds)
+    app_module.slot_reservations.init()
+
+    totals = Counter()
+    started = time.perf_counter()
+    for number in range(args.rounds):
+        totals += run_round(number, args)
+    elapsed = time.perf_counter() - started
+    print(f"{args.rounds} rounds of {args.patients} patients through reserve_slot in {elapsed:.2f}s "
+          f"(hold {args.hold_seconds}s, insert {args.insert_latency}s, {args.failure_rate:.0%} inserts failing)")
+    print(f"  confirmed {totals['confirmed']}, lost the race {totals['lost']}, "
+          f"insert failed {totals['insert failed']}; one event per confirmed booking")
@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionPool
+from slot_reservations import SlotReservations
+
+# Many patients in several worker processes race to hold and confirm a small
+# set of slots in one SQLite file. Every slot must end up with at most one
+# completed booking, and the table must agree with what the winners saw.
+
+CALENDAR_ID = "primary"
+
+
+def slot_starts(count):
+    return [f"2030-01-07T{9 + i // 2:02d}:{30 * (i % 2):02d}:00" for i in range(count)]
+
+
+def patient(reservations, slots, patient_id, barrier):
+    slot = random.choice(slots)
+    barrier.wait()
+    version = reservations.hold(CALENDAR_ID, slot, patient_id)
+    if version is None:
+        return None
+    time.sleep(random.uniform(0, 0.005))  # the rest of the request runs here
+    if not reservations.confirm(CALENDAR_ID, slot, patient_id, version):
+        return None
+    time.sleep(random.uniform(0, 0.005))  # the calendar insert runs here
+    assert reservations.complete(CALENDAR_ID, slot, patient_id)
+    return slot
+
+
+def worker_process(args):
+    path, worker, patients, slot_count = args
+    reservations = SlotReservations(ConnectionPool(path))
+    slots = slot_starts(slot_count)
+    barrier = threading.Barrier(patients)
+    with ThreadPoolExecutor(max_workers=patients) as executor:
+        futures = [executor.submit(patient, reservations, slots, f"w{worker}-p{i}", barrier)
+                   for i in range(patients)]
+        return [(f"w{worker}-p{i}", future.result()) for i, future in enumerate(futures)]
+
+
+def check_expiry(path):
+    # An unconfirmed hold lapses: another patient takes the slot and the
+    # original holder's confirm is rejected.
+    reservations = SlotReservations(ConnectionPool(path), hold_seconds=0.05)
+    slot = "2030-01-08T09:00:00"
+    stale = reservations.hold(CALENDAR_ID, slot, "slow-patient")
+    assert reservations.hold(CALENDAR_ID, slot, "quick-patient") is None
+    time.sleep(0.1)
+    fresh = reservations.hold(CALENDAR_ID, slot, "quick-patient")
+    assert fresh is not None
+    assert not reservations.confirm(CALENDAR_ID, slot, "slow-patient", stale)
+    assert reservations.confirm(CALENDAR_ID, slot, "quick-patient", fresh)
+
+
+def check_booking_lapse(path):
+    # A booking whose process died between confirm and complete lapses, and the
+    # dead process can no longer complete it; a completed booking never lapses.
+    reservations = SlotReservations(ConnectionPool(path), booking_seconds=0.05)
+    slot = "2030-01-09T09:00:00"
+    crashed = reservations.hold(CALENDAR_ID, slot, "crashed-worker")
+    assert reservations.confirm(CALENDAR_ID, slot, "crashed-worker", crashed)
+    assert reservations.hold(CALENDAR_ID, slot, "next-patient") is None
+    time.sleep(0.1)
+    version = reservations.hold(CALENDAR_ID, slot, "next-patient")
+    assert version is not None
+    assert not reservations.complete(CALENDAR_ID, slot, "crashed-worker")
+    assert reservations.confirm(CALENDAR_ID, slot, "next-patient", version)
+    assert reservations.complete(CALENDAR_ID, slot, "next-patient")
+    time.sleep(0.1)
+    assert reservations.hold(CALENDAR_ID, slot, "late-patient") is None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--patients", type=int, default=100, help="concurrent patients per process")
+    parser.add_argument("--slots", type=int, default=16)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "reservations.db")
+    SlotReservations(ConnectionPool(path)).init()
+
+    started = time.perf_counter()
+    with Pool(args.processes) as pool:
+        outcomes = [outcome for results in pool.map(
+            worker_process, [(path, w, args.patients, args.slots) for w in range(args.processes)])
+            for outcome in results]
+    elapsed = time.perf_counter() - started
+
+    winners = Counter(slot for _, slot in outcomes if slot is not None)
+    double_booked = [slot for slot, count in winners.items() if count > 1]
+    rows = ConnectionPool(path).query(
+        "SELECT slot_start, holder FROM slot_reservations WHERE status = 'confirmed'")
+    expected = {slot: holder for holder, slot in outcomes if slot is not None}
+    assert dict(rows) == expected, "confirmed rows disagree with the winners"
+    check_expiry(path)
+    check_booking_lapse(path)
+
+    total = args.processes * args.patients
+    print(f"{total} patients across {args.processes} processes racing for {args.slots} slots "
+          f"in {elapsed:.2f}s")
+    print(f"  confirmed {sum(winners.values())}, double-booked {len(double_booked)}, "
+          f"slots left free {args.slots - len(winners)}")
+    print("  hold expiry: stale confirm rejected, slot re-held")
+    print("  booking lapse: unfinished booking freed, completed booking kept")
+    sys.exit(1 if double_booked else 0)
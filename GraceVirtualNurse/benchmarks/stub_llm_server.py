@@ -0,0 +1,81 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI chat completions endpoint.
+# Point Grace at it with OPENAI_API_BASE=http://127.0.0.1:8001/v1
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+    disable_nagle_algorithm = True
+    latency = 0.2
+    token_delay = 0.02
+    reply = "I'm sorry you're not feeling well. Please rest, drink fluids and let me know if it gets worse."
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        if payload.get("stream"):
+            self._stream_reply()
+            return
+
+        body = json.dumps({
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply},
+                         "finish_reason": "stop"}],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_reply(self):
+        # Server-sent events, one word per chunk, then [DONE].
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, latency=0.2):
+    # Starts the stub in a daemon thread and returns (server, base_url).
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stub OpenAI server with simulated latency")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, args.latency)
+    print(f"Stub LLM listening on {url} ({args.latency}s latency)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
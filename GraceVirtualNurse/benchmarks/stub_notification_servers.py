@@ -0,0 +1,116 @@
+import argparse
+import json
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for the SMTP server and the SMS gateway.
+#   GRACE_SMTP_HOST=127.0.0.1 GRACE_SMTP_PORT=1025 GRACE_SMTP_SSL=0
+#   GRACE_SMS_BACKEND=http GRACE_SMS_URL=http://127.0.0.1:8002/sms
+
+
+class _Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    def add(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class DebugSMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP to accept and count messages.
+    latency = 0.0
+    counters = None
+
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        self.counters.add("connections")
+        self._reply("220 grace-debug-smtp ready")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    time.sleep(self.latency)
+                    self.counters.add("messages")
+                    self._reply("250 OK queued")
+                continue
+            command = line[:4].upper()
+            if command in ("HELO", "EHLO"):
+                self._reply("250 grace-debug-smtp")
+            elif command == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self._reply("250 OK")
+
+
+class StubSMSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    counters = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        self.counters.add("messages")
+        body = json.dumps({"sid": "SM" + uuid.uuid4().hex}).encode("utf-8")
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_smtp_server(port=0, latency=0.0):
+    # Returns (server, port, counters); the server runs in a daemon thread.
+    counters = _Counters()
+    handler = type("ConfiguredSMTPHandler", (DebugSMTPHandler,), {"latency": latency, "counters": counters})
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1], counters
+
+
+def start_sms_server(port=0, latency=0.0):
+    # Returns (server, url, counters).
+    counters = _Counters()
+    handler = type("ConfiguredSMSHandler", (StubSMSHandler,), {"latency": latency, "counters": counters})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/sms", counters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local SMTP and SMS stubs")
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--sms-port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    _, smtp_port, smtp_counters = start_smtp_server(args.smtp_port, args.latency)
+    _, sms_url, sms_counters = start_sms_server(args.sms_port, args.latency)
+    print(f"SMTP on 127.0.0.1:{smtp_port}, SMS on {sms_url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"emails={smtp_counters.messages} (connections={smtp_counters.connections}) "
+                  f"sms={sms_counters.messages}")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+# --- Configurations ---
+CALENDAR_TTL_SECONDS = float(os.getenv("GRACE_CALENDAR_TTL", "60"))
+# {"Dr. Smith": "smith@group.calendar.google.com", ...}; default is the service account's primary calendar.
+DOCTOR_CALENDARS = json.loads(os.getenv("GRACE_DOCTOR_CALENDARS", "{}")) or {None: "primary"}
+
+DAY_START_HOUR = 9
+DAY_END_HOUR = 17
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = (DAY_END_HOUR - DAY_START_HOUR) * 60 // SLOT_MINUTES
+SLOT_FORMAT = "%A, %B %d, %Y at %I:%M %p"
+
+
+class SyncTokenExpired(Exception):
+    # The backend no longer accepts the sync token; a full resync is needed.
+    pass
+
+
+def _to_local(raw):
+    # Calendar times arrive as RFC 3339 strings (or plain dates for all-day events).
+    if "T" not in raw:
+        return datetime.combine(date.fromisoformat(raw), datetime.min.time())
+    parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def _event_interval(event):
+    start = event["start"].get("dateTime", event["start"].get("date"))
+    end = event["end"].get("dateTime", event["end"].get("date"))
+    return _to_local(start), _to_local(end)
+
+
+def _slot_mask(start, end, day):
+    # Bitmask of the day's slots that [start, end) overlaps; bit i is slot i.
+    day_open = datetime.combine(day, datetime.min.time()).replace(hour=DAY_START_HOUR)
+    first = int((start - day_open).total_seconds() // (SLOT_MINUTES * 60))
+    last = -int(-(end - day_open).total_seconds() // (SLOT_MINUTES * 60))  # ceil
+    first, last = max(first, 0), min(last, SLOTS_PER_DAY)
+    if first >= last:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+class GoogleCalendarBackend:
+    # Reads events through the Calendar API, following every page and using
+    # sync tokens for incremental refreshes.
+
+    def __init__(self, service_factory):
+        self._service_factory = service_factory
+
+    def list_events(self, calendar_id, time_min=None, sync_token=None):
+        from googleapiclient.errors import HttpError
+
+        service = self._service_factory()
+        params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = time_min.astimezone().isoformat()
+        events, page_token = [], None
+        while True:
+            try:
+                page = service.events().list(pageToken=page_token, **params).execute()
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpired(calendar_id) from e
+                raise
+            events.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return events, page.get("nextSyncToken")
+
+
+class _CalendarState:
+    def __init__(self):
+        self.reset()
+        self.booked = {}                      # day -> slots booked through Grace since the last sync
+
+    def reset(self):
+        self.sync_token = None
+        self.synced_at = 0.0
+        self.events = {}                      # event id -> (start, end)
+        self.day_events = defaultdict(set)    # day -> event ids touching it
+        self.busy = {}                        # day -> occupied slot bitmask
+
+
+class AvailabilityIndex:
+    # In-memory slot occupancy per doctor calendar and day, kept as one bitmap
+    # per day. The first lookup does a full sync; after that, lookups are
+    # served from memory and a refresh older than ttl only pulls the events
+    # that changed since the last sync token.
+
+    def __init__(self, backend, calendars=DOCTOR_CALENDARS, ttl=CALENDAR_TTL_SECONDS):
+        self.backend = backend
+        self.calendars = dict(calendars)
+        self.ttl = ttl
+        self._state = {calendar_id: _CalendarState() for calendar_id in self.calendars.values()}
+        self._lock = threading.Lock()
+
+    def _days(self, start, end):
+        day = start.date()
+        while datetime.combine(day, datetime.min.time()) < end:
+            yield day
+            day += timedelta(days=1)
+
+    def _recompute(self, state, days):
+        for day in days:
+            mask = 0
+            for event_id in state.day_events.get(day, ()):
+                start, end = state.events[event_id]
+                mask |= _slot_mask(start, end, day)
+            state.busy[day] = mask
+
+    def _apply(self, state, events):
+        touched = set()
+        for event in events:
+            event_id = event["id"]
+            old = state.events.pop(event_id, None)
+            if old:
+                for day in self._days(*old):
+                    state.day_events[day].discard(event_id)
+                    touched.add(day)
+            if event.get("status") == "cancelled" or "start" not in event:
+                continue
+            start, end = _event_interval(event)
+            state.events[event_id] = (start, end)
+            for day in self._days(start, end):
+                state.day_events[day].add(event_id)
+                touched.add(day)
+        self._recompute(state, touched)
+
+    def _sync(self, calendar_id, state):
+        try:
+            events, token = self.backend.list_events(calendar_id, sync_token=state.sync_token,
+                                                      time_min=self._window_start())
+        except SyncTokenExpired:
+            state.reset()
+            events, token = self.backend.list_events(calendar_id, time_min=self._window_start())
+        self._apply(state, events)
+        state.booked.clear()  # our own bookings are now part of the synced events
+        state.sync_token = token
+        state.synced_at = time.monotonic()
+
+    def _window_start(self):
+        return datetime.combine(date.today(), datetime.min.time())
+
+    def refresh(self, force=False):
+        with self._lock:
+            for calendar_id, state in self._state.items():
+                if force or time.monotonic() - state.synced_at >= self.ttl:
+                    self._sync(calendar_id, state)
+
+    def mark_busy(self, calendar_id, start, end=None):
+        # Records a booking made through Grace right away, without waiting for the next sync.
+        end = end or start + timedelta(minutes=SLOT_MINUTES)
+        with self._lock:
+            state = self._state[calendar_id]
+            for day in self._days(start, end):
+                state.booked[day] = state.booked.get(day, 0) | _slot_mask(start, end, day)
+
+    def free_slots(self, day=None, doctor=None):
+        # [(doctor, slot_start), ...] for free slots on `day`, in time order.
+        day = day or date.today()
+        self.refresh()
+        day_open = datetime.combine(day, datetime.min.time()).replace(hour=DAY_START_HOUR)
+        slots = []
+        with self._lock:
+            for name, calendar_id in self.calendars.items():
+                if doctor is not None and name != doctor:
+                    continue
+                state = self._state[calendar_id]
+                busy = state.busy.get(day, 0) | state.booked.get(day, 0)
+                for i in range(SLOTS_PER_DAY):
+                    if not busy >> i & 1:
+                        slots.append((name, day_open + timedelta(minutes=i * SLOT_MINUTES)))
+        slots.sort(key=lambda slot: slot[1])
+        return slots
+
+
+def format_slot(doctor, start):
+    text = start.strftime(SLOT_FORMAT)
+    return f"{text} with {doctor}" if doctor else text
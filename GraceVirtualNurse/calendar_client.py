@@ -0,0 +1,62 @@
+import json
+import threading
+
+# Google's batch endpoint accepts up to 1000 calls, but recommends keeping
+# batches small; 50 keeps each round-trip well under the per-request limits.
+BATCH_SIZE = 50
+HTTP_TIMEOUT = 30
+
+
+class CalendarClient:
+    # Long-lived Calendar API client. The discovery document is parsed once
+    # (from the copy bundled with google-api-python-client, so no network
+    # fetch), and each thread gets its own service object on top of its own
+    # keep-alive httplib2 connection, since httplib2.Http is not thread-safe.
+
+    def __init__(self, credentials_factory):
+        self._credentials_factory = credentials_factory
+        self._credentials = None
+        self._discovery_doc = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _document(self):
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    from googleapiclient.discovery_cache import get_static_doc
+                    self._credentials = self._credentials_factory()
+                    self._discovery_doc = json.loads(get_static_doc("calendar", "v3"))
+        return self._discovery_doc
+
+    def service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.discovery import build_from_document
+
+            document = self._document()
+            http = AuthorizedHttp(self._credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            service = self._local.service = build_from_document(document, http=http)
+        return service
+
+    def insert_event(self, calendar_id, event):
+        return self.service().events().insert(calendarId=calendar_id, body=event).execute()
+
+    def insert_events(self, calendar_id, events):
+        # Inserts many events with one HTTP round-trip per BATCH_SIZE events.
+        # Returns the created events in order, with the exception in place of
+        # any insert that failed.
+        service = self.service()
+        results = [None] * len(events)
+
+        def on_result(request_id, response, exception):
+            results[int(request_id)] = exception if exception is not None else response
+
+        for offset in range(0, len(events), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_result)
+            for i, event in enumerate(events[offset:offset + BATCH_SIZE], start=offset):
+                batch.add(service.events().insert(calendarId=calendar_id, body=event), request_id=str(i))
+            batch.execute()
+        return results
@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+from collections import deque
+
+# --- Configurations ---
+CONTEXT_HISTORY_TOKENS = int(os.getenv("GRACE_CONTEXT_HISTORY_TOKENS", "250"))  # recent turns, verbatim
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("GRACE_CONTEXT_SUMMARY_TOKENS", "80"))   # older turns, condensed
+CONTEXT_TOP_SLOTS = int(os.getenv("GRACE_CONTEXT_TOP_SLOTS", "3"))
+MAX_SYMPTOMS = 12
+TURN_TOKENS = 60        # longest single message kept in the history
+REPLY_NOTE_TOKENS = 30  # how much of Grace's reply is remembered
+SUMMARY_NOTE_TOKENS = 20
+
+# Surface form -> canonical symptom. Multi-word forms are matched before the
+# words inside them, so "chest pain" is not also counted as "pain".
+SYMPTOM_LEXICON = {
+    "headache": "headache", "migraine": "headache", "head hurts": "headache",
+    "fever": "fever", "temperature": "fever", "feverish": "fever",
+    "cough": "cough", "coughing": "cough",
+    "sore throat": "sore throat", "throat hurts": "sore throat",
+    "runny nose": "runny nose", "stuffy": "congestion", "congested": "congestion", "congestion": "congestion",
+    "chills": "chills", "shivering": "chills",
+    "nausea": "nausea", "nauseous": "nausea", "feel sick": "nausea",
+    "vomiting": "vomiting", "throwing up": "vomiting", "vomited": "vomiting",
+    "diarrhea": "diarrhea", "diarrhoea": "diarrhea",
+    "dizzy": "dizziness", "dizziness": "dizziness", "lightheaded": "dizziness",
+    "tired": "fatigue", "fatigue": "fatigue", "exhausted": "fatigue", "no energy": "fatigue",
+    "rash": "rash", "itchy": "itching", "itching": "itching",
+    "chest pain": "chest pain", "shortness of breath": "shortness of breath",
+    "short of breath": "shortness of breath", "breathless": "shortness of breath",
+    "back pain": "back pain", "stomach ache": "abdominal pain", "stomach pain": "abdominal pain",
+    "abdominal pain": "abdominal pain", "cramps": "cramps", "sore": "soreness", "aches": "body aches",
+    "body aches": "body aches", "pain": "pain", "swelling": "swelling", "swollen": "swelling",
+    "insomnia": "insomnia", "can't sleep": "insomnia", "anxious": "anxiety", "anxiety": "anxiety",
+}
+NEGATION_WORDS = {"no", "not", "without", "never", "don't", "dont", "didn't", "haven't", "hasn't",
+                  "isn't", "aren't", "denies", "longer"}
+
+_SYMPTOM_PATTERN = re.compile(
+    r"(?<![\w'])(" + "|".join(re.escape(k) for k in sorted(SYMPTOM_LEXICON, key=len, reverse=True)) + r")(?![\w'])"
+)
+_CLAUSE_BREAK = re.compile(r"[.,;!?]|\bbut\b|\band\b")
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SLOT_TIME = re.compile(r"at (\d{1,2}):(\d{2}) (AM|PM)")
+_ASKED_TIME = re.compile(r"\b(\d{1,2})(?::\d{2})?\s*(am|pm)\b|\bat (\d{1,2})(?::\d{2})?\b")
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+# --- Token Counting ---
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    # tiktoken gives exact counts when it is installed; otherwise we estimate.
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        try:
+            import tiktoken
+            from llm_client import LLM_MODEL
+            _encoder = tiktoken.encoding_for_model(LLM_MODEL)
+        except Exception:
+            _encoder = None
+        _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text):
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    # Roughly one token per short word or punctuation mark, more for long words.
+    return sum(1 + len(piece) // 7 for piece in _WORD_PATTERN.findall(text))
+
+
+def clip_tokens(text, budget, keep_end=False):
+    # Trims whole words until text fits in budget tokens.
+    words = text.split()
+    words = words[-budget:] if keep_end else words[:budget]  # every word is at least one token
+    while words and count_tokens(" ".join(words)) > budget:
+        if keep_end:
+            words.pop(0)
+        else:
+            words.pop()
+    return " ".join(words)
+
+
+# --- Symptom Entities ---
+def extract_symptoms(text):
+    # Returns (reported, denied) canonical symptoms, e.g. "no fever but a bad
+    # cough" -> (["cough"], ["fever"]).
+    lowered = text.lower()
+    reported, denied = [], []
+    for found in _SYMPTOM_PATTERN.finditer(lowered):
+        clause = _CLAUSE_BREAK.split(lowered[:found.start()])[-1].split()
+        negated = any(word in NEGATION_WORDS for word in clause[-3:])
+        target, other = (denied, reported) if negated else (reported, denied)
+        symptom = SYMPTOM_LEXICON[found.group(1)]
+        if symptom in other:  # the later mention wins
+            other.remove(symptom)
+        if symptom not in target:
+            target.append(symptom)
+    return reported, denied
+
+
+def note_symptoms(memory, text):
+    # Keeps memory["symptoms"] as the patient's current symptoms, most recent last.
+    reported, denied = extract_symptoms(text)
+    symptoms = [s for s in memory.get("symptoms", []) if s not in denied and s not in reported]
+    memory["symptoms"] = (symptoms + reported)[-MAX_SYMPTOMS:]
+    return reported
+
+
+# --- Rolling Conversation History ---
+def _context(memory):
+    return memory.setdefault("context", {"summary": "", "turns": []})
+
+
+def _turn_text(user_text, reply_note):
+    return f"Patient: {user_text}\nGrace: {reply_note}" if reply_note else f"Patient: {user_text}"
+
+
+def record_turn(memory, user_input):
+    # Adds the patient's message to the recent history. When the history goes
+    # over its budget, the oldest turns are condensed into the summary, which
+    # itself keeps only its most recent CONTEXT_SUMMARY_TOKENS.
+    context = _context(memory)
+    user_text = clip_tokens(user_input, TURN_TOKENS)
+    context["turns"].append([user_text, "", count_tokens(_turn_text(user_text, ""))])
+    while len(context["turns"]) > 1 and sum(t[2] for t in context["turns"]) > CONTEXT_HISTORY_TOKENS:
+        oldest = context["turns"].pop(0)
+        note = clip_tokens(oldest[0], SUMMARY_NOTE_TOKENS)
+        context["summary"] = clip_tokens(f"{context['summary']} {note};".strip(), CONTEXT_SUMMARY_TOKENS,
+                                         keep_end=True)
+
+
+def record_reply(memory, reply, user_input=None):
+    # Remembers the start of Grace's answer to the latest turn, or with
+    # user_input, to the latest unanswered turn for that message (a streamed
+    # reply lands after later turns may have been added). Returns False if
+    # that turn is gone, e.g. already condensed into the summary.
+    turns = _context(memory)["turns"]
+    if user_input is None:
+        turn = turns[-1] if turns else None
+    else:
+        user_text = clip_tokens(user_input, TURN_TOKENS)
+        turn = next((t for t in reversed(turns) if t[0] == user_text and not t[1]), None)
+    if turn is None:
+        return False
+    first_sentence = re.split(r"(?<=[.!?])\s", reply.strip(), maxsplit=1)[0]
+    turn[1] = clip_tokens(first_sentence, REPLY_NOTE_TOKENS)
+    turn[2] = count_tokens(_turn_text(turn[0], turn[1]))
+    return True
+
+
+# --- Slot Selection ---
+def rank_slots(slots, user_input, k=CONTEXT_TOP_SLOTS):
+    # The k slots that best match what the patient asked for (doctor, weekday,
+    # morning/afternoon, a clock time); earliest first when nothing matches.
+    text = user_input.lower()
+    asked_hours = set()
+    for stated_hour, meridiem, at_hour in _ASKED_TIME.findall(text):
+        hour = int(stated_hour or at_hour)
+        if meridiem == "pm" and hour < 12:
+            hour += 12
+        elif not meridiem and hour < 8:
+            hour += 12  # "at 3" during clinic hours means 3 PM
+        asked_hours.add(hour)
+
+    def score(slot):
+        lowered = slot.lower()
+        points = 0
+        if " with " in lowered and lowered.split(" with ", 1)[1].split()[-1] in text:
+            points += 3
+        points += 2 * sum(1 for day in _WEEKDAYS if day in text and lowered.startswith(day))
+        found = _SLOT_TIME.search(slot)
+        if found:
+            hour = int(found.group(1)) % 12 + (12 if found.group(3) == "PM" else 0)
+            if hour in asked_hours:
+                points += 3
+            if ("morning" in text and hour < 12) or ("afternoon" in text and hour >= 12):
+                points += 2
+        return points
+
+    ranked = sorted(range(len(slots)), key=lambda i: (-score(slots[i]), i))
+    return [slots[i] for i in ranked[:k]]
+
+
+# --- Prompt Assembly ---
+def build_prompt(memory, user_input, slots=()):
+    # Returns (prompt, token counts by section) for the open-ended fallback reply.
+    context = _context(memory)
+    sections = {
+        "name": f"Patient's name is {memory['name']}.\n" if memory.get("name") else "",
+        "symptoms": (f"Current symptoms: {', '.join(memory['symptoms'])}\n"
+                     if memory.get("symptoms") else ""),
+        "summary": f"Earlier in the conversation: {context['summary']}\n" if context["summary"] else "",
+        "history": ("Recent conversation:\n" + "\n".join(_turn_text(u, r) for u, r, _ in context["turns"]) + "\n"
+                    if context["turns"] else ""),
+        "message": f"The patient says: '{user_input}'.\n",
+        "slots": ("Here are upcoming available appointment slots:\n" + "\n".join(rank_slots(slots, user_input)) + "\n"
+                  if slots else ""),
+        "instructions": "\nProvide empathetic healthcare advice. Suggest a slot if appropriate. "
+                        "Use the patient's name if known.",
+    }
+    prompt = "".join(sections.values())
+    counts = {name: count_tokens(text) for name, text in sections.items() if text}
+    counts["prompt_tokens"] = count_tokens(prompt)
+    return prompt, counts
+
+
+class PromptStats:
+    # Rolling window of prompt sizes, in tokens.
+
+    def __init__(self, window=1000):
+        self._tokens = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, counts):
+        with self._lock:
+            self._tokens.append(counts["prompt_tokens"])
+
+    def snapshot(self):
+        with self._lock:
+            tokens = sorted(self._tokens)
+        if not tokens:
+            return {"count": 0, "prompt_tokens_mean": None, "prompt_tokens_p95": None, "prompt_tokens_max": None}
+        return {
+            "count": len(tokens),
+            "prompt_tokens_mean": sum(tokens) / len(tokens),
+            "prompt_tokens_p95": tokens[min(len(tokens) - 1, int(round(0.95 * (len(tokens) - 1))))],
+            "prompt_tokens_max": tokens[-1],
+        }
+
+
+prompt_stats = PromptStats()
@@ -0,0 +1,123 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from db import get_pool
+
+# --- Configurations ---
+LOG_BATCH_SIZE = int(os.getenv("GRACE_LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL = float(os.getenv("GRACE_LOG_FLUSH_INTERVAL", "0.5"))
+LOG_MAX_QUEUE = int(os.getenv("GRACE_LOG_MAX_QUEUE", "10000"))
+
+_STOP = object()
+
+
+class WriteBehindLogger:
+    # Buffers rows in a bounded queue and writes them from a background thread
+    # as multi-row transactions, so request threads never wait on a commit.
+    # A batch is written when it reaches batch_size rows or when flush_interval
+    # seconds have passed since its first row. If the queue is full, rows are
+    # dropped and counted instead of blocking the caller; once close() has
+    # started, new rows are refused and counted the same way.
+
+    def __init__(self, sql, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_queue=LOG_MAX_QUEUE, pool=None):
+        self.sql = sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pool = pool
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._counter_lock = threading.Lock()
+        self.accepted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="grace-log-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def log(self, *row):
+        # Checked and queued under the lock that close() takes to set _closed,
+        # so an accepted row is always ahead of the stop marker.
+        with self._counter_lock:
+            if not self._closed:
+                self._ensure_started()
+                try:
+                    self._queue.put_nowait(row)
+                    self.accepted += 1
+                    return True
+                except queue.Full:
+                    pass
+            self.dropped += 1
+        return False
+
+    def _write(self, batch):
+        try:
+            (self._pool or get_pool()).executemany(self.sql, batch)
+        except Exception as e:
+            with self._counter_lock:
+                self.failed += len(batch)
+            print("Error writing conversation log batch:", str(e))
+            return
+        with self._counter_lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+                deadline = None
+
+    def flush(self, timeout=10):
+        # Blocks until every row accepted so far has been written (or failed).
+        target = self.accepted
+        deadline = time.monotonic() + timeout
+        while self.written + self.failed < target and time.monotonic() < deadline:
+            time.sleep(min(0.01, self.flush_interval))
+
+    def close(self, timeout=10):
+        # Drains the queue and stops the writer thread.
+        with self._counter_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
@@ -0,0 +1,115 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import registry
+
+# --- Configurations ---
+DB_PATH = os.getenv("GRACE_DB_PATH", "grace_hospital.db")
+DB_POOL_SIZE = int(os.getenv("GRACE_DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = float(os.getenv("GRACE_DB_BUSY_TIMEOUT", "10"))
+
+# sqlite3 keeps a per-connection cache of compiled statements, so reusing
+# pooled connections with constant SQL strings gives us prepared statements.
+STATEMENT_CACHE_SIZE = 256
+
+DB_TRANSACTIONS = registry.counter("grace_db_transactions_total", "Pooled SQLite transactions by outcome.",
+                                   ("db", "outcome"))
+DB_SECONDS = registry.histogram("grace_db_seconds", "Time holding a pooled connection, including waits.", ("db",))
+
+
+class ConnectionPool:
+    # Thread-safe pool of SQLite connections in WAL mode. WAL lets readers run
+    # alongside a writer, and the busy timeout makes writers wait for the lock
+    # instead of failing with "database is locked".
+
+    def __init__(self, path=DB_PATH, size=DB_POOL_SIZE, busy_timeout=DB_BUSY_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._label = os.path.basename(path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=self.busy_timeout)
+
+    @contextmanager
+    def connection(self):
+        # One transaction per block: commit on success, roll back on error.
+        started = time.perf_counter()
+        conn = self._acquire()
+        outcome = "rollback"
+        try:
+            yield conn
+            conn.commit()
+            outcome = "commit"
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+            DB_TRANSACTIONS.inc(1, self._label, outcome)
+            DB_SECONDS.observe(time.perf_counter() - started, self._label)
+
+    def execute(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql, rows):
+        with self.connection() as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def query(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    # One shared pool per database file.
+    path = path or DB_PATH
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
@@ -1,89 +1,109 @@
-import openai
-import sqlite3
-import speech_recognition as sr
-import pyttsx3
 import time
 import random
-import smtplib
 import re
-from twilio.rest import Client
-from email.mime.text import MIMEText
-from flask import Flask, request, jsonify, render_template
+import json
+import uuid
+import hmac
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, make_response, render_template, stream_with_context
 from flask_cors import CORS
-from datetime import datetime, timezone, timedelta
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+from datetime import datetime, timedelta
 from medication_reminder import (
     init_medication_db,
     add_medication,
-    get_today_medications
+    parse_dose_times,
+    upsert_patient,
+    DEFAULT_DOSE_TIME
 )
-from apscheduler.schedulers.background import BackgroundScheduler
-from collections import defaultdict
+from medication_import import decode_lines, import_medications, read_records
+from db import get_pool
+from conversation_logger import WriteBehindLogger
+from notifications import get_notifier
+from speech_worker import get_speech_worker
+from voice_pipeline import MicrophoneSource, VoicePipeline, create_speech_backend
+from llm_client import get_llm_client, LLMError, LLMOverloadedError
+from intent_classifier import classify_intent
+from context_builder import build_prompt, note_symptoms, prompt_stats, record_reply, record_turn
+from response_cache import response_cache, cache_key
+from session_store import create_session_store
+from rate_limiter import (RATE_LIMIT_ADDRESS_BURST, RATE_LIMIT_ADDRESS_PER_MINUTE, create_rate_limiter,
+                          retry_after_header)
+from calendar_client import CalendarClient
+from calendar_availability import AvailabilityIndex, GoogleCalendarBackend, DOCTOR_CALENDARS, SLOT_FORMAT, format_slot
+from slot_reservations import SlotReservations, SlotTaken
+from reminder_engine import ReminderEngine, reminder_message
+from leader_lock import LeaderLock, run_as_leader
+from metrics import CONTENT_TYPE, finish_trace, registry, span, start_trace, tag, traced
 
 import os
 OPENAI_API_KEY    = os.getenv("OPENAI_API_KEY")
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN  = os.getenv("TWILIO_AUTH_TOKEN")
 
 # --- Configurations ---
-openai.api_key = "OPENAI_API_KEY"  # Replace with your key or load from environment
-app = Flask(__name__, static_folder="static", template_folder="templates")
-CORS(app)
+# The LLM client reads OPENAI_API_KEY (and optionally OPENAI_API_BASE) from the environment.
+# Routes live on a blueprint; create_app() builds the Flask app around it.
+grace = Blueprint("grace", __name__)
+# "auto": the first process to take the scheduler lock runs the reminder engine; "on" / "off" force it.
+SCHEDULER_MODE = os.getenv("GRACE_SCHEDULER", "auto")
+# Bearer token for admin endpoints (POST /medications/import); they are disabled while it is unset.
+ADMIN_TOKEN = os.getenv("GRACE_ADMIN_TOKEN", "")
 
 # --- Google Calendar Credentials ---
-SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 SERVICE_ACCOUNT_FILE = 'credentials.json'
-creds = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE, scopes=SCOPES
-)
+
+def load_calendar_credentials():
+    # Read on the first calendar call, not at import.
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE, scopes=SCOPES
+    )
+
+# One Calendar client for the process: the discovery document is parsed once and
+# each thread keeps its own authorized keep-alive connection.
+calendar_client = CalendarClient(load_calendar_credentials)
 
 # --- Session Memory ---
-session_memory = defaultdict(lambda: {
-    "name": None,
-    "symptoms": [],
-    "last_topic": "",
-    "last_appointment": None,
-    "available_slots": [],
-    "greeted": False
-})
+# Keyed by a per-patient session id; GRACE_SESSION_BACKEND=sqlite shares it across workers.
+SESSION_COOKIE = "grace_session"
+session_store = create_session_store()
+# Messages per session, inside a larger cap per client address;
+# GRACE_RATE_LIMIT_BACKEND=sqlite enforces both across workers.
+rate_limiter = create_rate_limiter()
+address_limiter = create_rate_limiter(per_minute=RATE_LIMIT_ADDRESS_PER_MINUTE, burst=RATE_LIMIT_ADDRESS_BURST)
+
+def rate_limit_keys(session_id):
+    # Session ids are chosen by the client, so every request is charged to the
+    # client address, a hard cap however many ids it rotates through; a session
+    # that already exists is also charged to its own, smaller bucket, so one
+    # patient cannot use up an address that a whole ward shares. Behind a
+    # reverse proxy the address is the proxy's unless the app is wrapped in ProxyFix.
+    keys = []
+    if address_limiter is not None:
+        keys.append((address_limiter, f"addr:{request.remote_addr}"))
+    if rate_limiter is not None and session_id in session_store:
+        keys.append((rate_limiter, f"session:{session_id}"))
+    return keys
+
+def check_rate_limit(session_id):
+    # None if the request may go ahead, else the 429 response.
+    for limiter, key in rate_limit_keys(session_id):
+        allowed, retry_after = limiter.acquire(key)
+        if not allowed:
+            response = jsonify({"response": "You're sending messages faster than I can keep up. "
+                                            "Please wait a moment and try again."})
+            response.status_code = 429
+            response.headers["Retry-After"] = retry_after_header(retry_after)
+            return response
+    return None
+
+def get_session_id(data):
+    return (data.get("session_id")
+            or request.headers.get("X-Session-Id")
+            or request.cookies.get(SESSION_COOKIE)
+            or uuid.uuid4().hex)
 
 # --- Helper: Intent Recognition ---
 def get_user_intent(user_input):
-    user_input = user_input.lower().strip()
-    
-    # Check for summary intent first.
-    if "summary" in user_input:
-        return "summary"
-    
-    # Prioritize name extraction.
-    if "my name is" in user_input:
-        return "provide_name"
-    
-    # Check for symptom keywords.
-    symptom_keywords = ["headache", "fever", "cough", "pain", "stuffy", "sore throat", "chills", "sore"]
-    if any(keyword in user_input for keyword in symptom_keywords):
-        return "symptom"
-    
-    # Check for greetings using whole words.
-    greeting_keywords = ["hi", "hello", "hey"]
-    if any(word in user_input.split() for word in greeting_keywords):
-        return "greeting"
-    
-    # Appointment-related intents.
-    if "confirm" in user_input or user_input in ["yes", "y"]:
-        return "confirm_booking"
-    if "book" in user_input or "appointment" in user_input:
-        if "cancel" in user_input:
-            return "cancel_appointment"
-        elif "reschedule" in user_input:
-            return "reschedule_appointment"
-        else:
-            return "book_appointment"
-    if "remind" in user_input or "medication" in user_input:
-        return "medication_reminder"
-    
-    return "unknown"
+    return classify_intent(user_input).intent
 
 def get_greeting(memory):
     if not memory.get("greeted"):
@@ -104,29 +124,66 @@ def get_greeting(memory):
         return generate_response(prompt)
 
 # --- Booking Helpers ---
-def book_appointment(doctor_name, date, time_str):
+def appointment_event(doctor_name, date, time_str):
     # Create a summary and time details
-    event = {
+    start = datetime.fromisoformat(f'{date}T{time_str}')
+    end = start + timedelta(minutes=30)  # Assuming a 30-minute slot
+    return {
         'summary': f'Appointment with {doctor_name}',
         'start': {
-            'dateTime': f'{date}T{time_str}:00',
+            'dateTime': start.isoformat(),
             'timeZone': 'UTC'
         },
         'end': {
-            'dateTime': f'{date}T{time_str}:30',  # Assuming a 30-minute slot
+            'dateTime': end.isoformat(),
             'timeZone': 'UTC'
         }
     }
-    service = build('calendar', 'v3', credentials=creds)
-    event_result = service.events().insert(calendarId='primary', body=event).execute()
+
+@traced("book_appointment")
+def book_appointment(doctor_name, date, time_str):
+    calendar_id = DOCTOR_CALENDARS.get(doctor_name, "primary")
+    calendar_client.insert_event(calendar_id, appointment_event(doctor_name, date, time_str))
     return f"Appointment booked with {doctor_name} on {date} at {time_str}."
 
-def remove_slot(doctor_name, date, time):
-    slots = doctors_schedule.get(doctor_name, [])
-    for slot in slots:
-        if slot["date"] == date and slot["time"] == time:
-            slots.remove(slot)
-            break
+def book_appointments(bookings):
+    # Bulk scheduling: [(doctor_name, date, time_str), ...] -> one message (or exception) per booking.
+    # Each slot is held and confirmed in slot_reservations first, like a patient's
+    # booking, so bulk runs and chat sessions on any worker cannot double-book;
+    # a slot someone else has gets SlotTaken. Each doctor's calendar then gets
+    # its inserts in batched round-trips.
+    batch_id = uuid.uuid4().hex
+    results = [None] * len(bookings)
+    by_calendar = {}
+    for i, (doctor_name, date, time_str) in enumerate(bookings):
+        calendar_id = DOCTOR_CALENDARS.get(doctor_name, "primary")
+        slot_start = datetime.fromisoformat(f"{date}T{time_str}").isoformat()
+        holder = f"bulk-{batch_id}-{i}"
+        version = slot_reservations.hold(calendar_id, slot_start, holder)
+        if version is None or not slot_reservations.confirm(calendar_id, slot_start, holder, version):
+            results[i] = SlotTaken(f"{doctor_name} on {date} at {time_str} is already taken.")
+            continue
+        by_calendar.setdefault(calendar_id, []).append(
+            (i, slot_start, holder, appointment_event(doctor_name, date, time_str)))
+    for calendar_id, entries in by_calendar.items():
+        try:
+            created = calendar_client.insert_events(calendar_id, [event for *_, event in entries])
+        except Exception as e:
+            created = [e] * len(entries)
+        for (i, slot_start, holder, _), outcome in zip(entries, created):
+            doctor_name, date, time_str = bookings[i]
+            if isinstance(outcome, Exception):
+                slot_reservations.cancel(calendar_id, slot_start, holder)
+                results[i] = outcome
+            else:
+                slot_reservations.complete(calendar_id, slot_start, holder)
+                results[i] = f"Appointment booked with {doctor_name} on {date} at {time_str}."
+                availability.mark_busy(calendar_id, datetime.fromisoformat(slot_start))
+    return results
+
+def remove_slot(calendar_id, start):
+    # Mark a just-booked slot as taken in the availability index.
+    availability.mark_busy(calendar_id, start)
 
 # --- Other Helper Functions ---
 def list_available_slots(memory):
@@ -143,186 +200,337 @@ def confirm_slot(slot_text, memory):
     memory["last_topic"] = "booking_confirmed"
     return f"📅 Appointment with {doctor} at {start_time} confirmed."
 
-def handle_symptoms(user_input, memory):
+def symptom_prompt(user_input):
     # Build a dynamic prompt for ChatGPT to generate an empathetic response.
-    prompt = (
+    return (
         "You are Grace, a compassionate virtual nurse for Grace Hospital. "
         "A patient reports the following symptoms: '" + user_input + "'. "
         "Provide an empathetic response that acknowledges the symptoms and offers guidance. "
         "Also, ask if the patient would like to schedule an appointment if their condition worsens."
     )
-    return generate_response(prompt)
+
+def symptom_cache_key(user_input):
+    return cache_key("symptom", user_input)
+
+def handle_symptoms(user_input, memory):
+    return generate_response(symptom_prompt(user_input), cache_key=symptom_cache_key(user_input))
 
 def set_medication_reminder(times):
     # times should be a list of strings like ["08:00 AM", "12:00 PM", "6:00 PM"]
     for t in times:
-        send_email("user@example.com", "Medication Reminder", f"Please take your medication at {t}.")
-        send_sms("", f"Please take your medication at {t}.")
+        notify("user@example.com", "", "Medication Reminder", f"Please take your medication at {t}.")
     return "Great! I’ll remind you at the times you mentioned."
 
 # --- Database Setup ---
-def init_db():
-    conn = sqlite3.connect("grace_hospital.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS appointments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_input TEXT,
-        response TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
-    conn.close()
+INSERT_LOG = "INSERT INTO appointments (user_input, response) VALUES (?, ?)"
+# Conversation logs are written in batches by a background thread.
+conversation_log = WriteBehindLogger(INSERT_LOG)
 
+def init_db():
+    with get_pool().connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_input TEXT,
+            response TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )''')
+
+@traced("log_symptom")
 def log_symptom(user_input, response):
-    conn = sqlite3.connect("grace_hospital.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO appointments (user_input, response) VALUES (?, ?)", (user_input, response))
-    conn.commit()
-    conn.close()
+    conversation_log.log(user_input, response)
 
 # --- Voice Helpers ---
 def listen_to_user():
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Grace is listening...")
-        audio = recognizer.listen(source)
-        try:
-            return recognizer.recognize_google(audio)
-        except sr.UnknownValueError:
-            return "Sorry, I couldn't understand that."
-        except sr.RequestError:
-            return "Error connecting to the speech recognition service."
+    # Streams the microphone through VAD and incremental recognition; returns once the patient pauses.
+    source = MicrophoneSource()
+    pipeline = VoicePipeline(source, create_speech_backend(sample_rate=source.sample_rate))
+    print("Grace is listening...")
+    try:
+        text = pipeline.listen()
+    except Exception as e:
+        print("Speech recognition error:", str(e))
+        return "Error connecting to the speech recognition service."
+    return text or "Sorry, I couldn't understand that."
 
 def speak_response(text):
-    engine = pyttsx3.init()
-    engine.setProperty("rate", 135)
-    engine.say(text)
-    engine.runAndWait()
+    # Queued for the speech worker's long-lived engine; never blocks the caller.
+    return get_speech_worker().say(text)
 
 # --- Reminder System ---
+# Delivery goes through the shared notification service, which keeps SMTP
+# sessions and the SMS client alive between messages.
 def send_email(to_email, subject, body):
-    from_email = ""
-    password = ""  # Remember to secure your credentials!
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = to_email
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(from_email, password)
-        server.sendmail(from_email, to_email, msg.as_string())
+    get_notifier().send_email(to_email, subject, body)
 
 def send_sms(to_number, message_body):
-    account_sid = "TWILIO_ACCOUNT_SID"
-    auth_token = "TWILIO_AUTH_TOKEN"
-    twilio_number = ''
-    client = Client(account_sid, auth_token)
     try:
-        message = client.messages.create(
-            body=message_body,
-            from_=twilio_number,
-            to=to_number
-        )
-        print(f"SMS sent successfully! SID: {message.sid}")
-        return message.sid
+        sid = get_notifier().send_sms(to_number, message_body)
+        print(f"SMS sent successfully! SID: {sid}")
+        return sid
     except Exception as e:
-        print("Error sending SMS via Twilio:", str(e))
+        print("Error sending SMS:", str(e))
         return None
 
-def send_daily_medication_reminders():
-    reminders = get_today_medications()
-    if reminders:
-        msg = "Grace Medication Reminder:\n\n" + "\n".join(reminders)
-        send_email("", "Your Daily Medication Reminder", msg)
-        send_sms("", msg)
-        speak_response(msg)
-
-def speak_night_reminders():
-    msg = "Don’t forget to take your evening medication."
-    print("[Grace Night Reminder] Sending scheduled message...")
-    speak_response(msg)
-    send_email("", "Evening Pill Reminder", msg)
-    send_sms("", msg)
+@traced("notify")
+def notify(to_email, to_number, subject, body, sms_body=None):
+    # Fire-and-forget email + SMS from the notification workers, off the request thread.
+    notifier = get_notifier()
+    notifier.email(to_email, subject, body)
+    notifier.sms(to_number, sms_body or body)
+
+def dispatch_reminders(batch):
+    # Called by the reminder engine with due doses: [(reminder, delivered), ...].
+    # Channels in `delivered` went out on an earlier attempt and are skipped.
+    # Emails and texts for the whole batch go through the notifier's bulk
+    # senders, each worker over one connection. Returns an exception (or None)
+    # per dose; the engine retries the channels that failed.
+    notifier = get_notifier()
+    messages = [reminder_message(reminder) for reminder, _ in batch]
+    emails, texts = [], []
+    for i, ((reminder, delivered), msg) in enumerate(zip(batch, messages)):
+        print(f"[Grace Reminder] {reminder.patient_id}: {msg}")
+        if reminder.email and "email" not in delivered:
+            emails.append((i, (reminder.email, "Your Medication Reminder", msg)))
+        if reminder.phone and "sms" not in delivered:
+            texts.append((i, (reminder.phone, msg)))
+    failures = [[] for _ in batch]
+    for channel, pending, send_bulk in (("email", emails, notifier.email_bulk), ("sms", texts, notifier.sms_bulk)):
+        results = send_bulk([args for _, args in pending]) if pending else []
+        for (i, args), result in zip(pending, results):
+            if isinstance(result, Exception):
+                failures[i].append(f"{channel} to {args[0]} ({result})")
+            else:
+                batch[i][1].add(channel)
+    for (reminder, delivered), msg in zip(batch, messages):
+        if "voice" not in delivered:
+            speak_response(msg)
+            delivered.add("voice")
+    return [RuntimeError("Reminder not delivered: " + "; ".join(failed)) if failed else None
+            for failed in failures]
 
 # --- AI Core ---
-def generate_response(prompt):
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are Grace, a helpful healthcare chatbot for Grace Hospital."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=200,
-        temperature=0.7
-    )
-    return response.choices[0].message["content"].strip()
+def llm_error_message(error):
+    if isinstance(error, LLMOverloadedError):
+        return "I'm helping a lot of patients right now. Please give me a moment and try again."
+    print("Error contacting the language model:", str(error))
+    return "Sorry, I'm having trouble thinking right now. Please try again shortly."
+
+@traced("generate_response")
+def generate_response(prompt, cache_key=None):
+    # Replies for prompts with a cache key are reused until they expire; error
+    # messages are never cached.
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    try:
+        response_text = get_llm_client().complete(prompt, max_tokens=200, temperature=0.7)
+    except LLMError as e:
+        return llm_error_message(e)
+    if cache_key is not None:
+        response_cache.put(cache_key, response_text)
+    return response_text
+
+def generate_response_stream(prompt, cache_key=None):
+    # Same as generate_response, but yields the reply piece by piece.
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    try:
+        # Timed until the last token, which is after the request's trace has ended.
+        with span("generate_response_stream"):
+            for token in get_llm_client().stream(prompt, max_tokens=200, temperature=0.7):
+                parts.append(token)
+                yield token
+    except LLMError as e:
+        yield llm_error_message(e)
+        return
+    if cache_key is not None:
+        response_cache.put(cache_key, "".join(parts).strip())
+
+def wants_stream(data):
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+def stream_reply(tokens, on_complete=None):
+    # Forward tokens to the browser as server-sent events; the final "done"
+    # event carries the full text so the client can speak it. on_complete gets
+    # the text streamed so far even if the client disconnects mid-reply.
+    def events():
+        parts = []
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        finally:
+            response_text = "".join(parts).strip()
+            if on_complete:
+                on_complete(response_text)
+        yield f"event: done\ndata: {json.dumps({'response': response_text})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Free/busy occupancy is cached in memory and refreshed incrementally via sync tokens.
+availability = AvailabilityIndex(GoogleCalendarBackend(calendar_client.service))
+# Holds and confirmed bookings, shared by all workers so two patients cannot take one slot.
+slot_reservations = SlotReservations()
+
+@traced("fetch_slots")
+def open_slots():
+    # Free calendar slots today that no other patient has booked or is holding.
+    taken = slot_reservations.taken(datetime.now().date())
+    return [(doctor, start) for doctor, start in availability.free_slots()
+            if (DOCTOR_CALENDARS.get(doctor, "primary"), start.isoformat()) not in taken]
 
 def fetch_google_calendar_slots():
-    service = build('calendar', 'v3', credentials=creds)
-    now = datetime.now(timezone.utc).isoformat()
-
-    # Define potential slots (e.g., every 30 minutes from 9 AM to 5 PM)
-    start_of_day = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
-    end_of_day = datetime.now().replace(hour=17, minute=0, second=0, microsecond=0)
-    potential_slots = []
-    current_time = start_of_day
-    while current_time < end_of_day:
-        potential_slots.append(current_time.strftime("%A, %B %d, %Y at %I:%M %p"))
-        current_time += timedelta(minutes=30)
-
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        maxResults=10,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    slots = potential_slots.copy()
-    for event in events_result.get('items', []):
-        start_raw = event['start'].get('dateTime', event['start'].get('date'))
-        if 'T' in start_raw:
-            start_dt = datetime.fromisoformat(start_raw.replace("Z", "+00:00"))
-            formatted_start = start_dt.strftime("%A, %B %d, %Y at %I:%M %p")
-            if formatted_start in slots:
-                slots.remove(formatted_start)
-    return slots
+    # Every 30 minutes from 9 AM to 5 PM today that no calendar event overlaps.
+    return [format_slot(doctor, start) for doctor, start in open_slots()]
+
+def offer_slots(memory, session_id=None):
+    # Gives back the session's current hold (if any) so its own slot is listed again.
+    if session_id is not None:
+        release_held_slot(memory, session_id)
+    slots = open_slots()
+    memory["available_slots"] = [format_slot(doctor, start) for doctor, start in slots]
+    memory["slot_choices"] = [[doctor, start.isoformat()] for doctor, start in slots]
+    return memory["available_slots"]
+
+def slot_key(memory, slot_index):
+    doctor, slot_start = memory["slot_choices"][slot_index]
+    return DOCTOR_CALENDARS.get(doctor, "primary"), slot_start
+
+def release_held_slot(memory, session_id):
+    held = memory.pop("held_slot", None)
+    if held is not None and held < len(memory.get("slot_choices") or []):
+        slot_reservations.release(*slot_key(memory, held), session_id)
+
+def hold_slot(slot_index, memory, session_id):
+    # Holds a listed slot while the patient decides, giving back any other slot
+    # the session was holding. Returns the hold's version, or None if another patient has it.
+    if memory.get("held_slot") not in (None, slot_index):
+        release_held_slot(memory, session_id)
+    version = slot_reservations.hold(*slot_key(memory, slot_index), session_id)
+    if version is None:
+        memory.pop("held_slot", None)
+    else:
+        memory["held_slot"] = slot_index
+    return version
+
+def hold_minutes():
+    return max(1, round(slot_reservations.hold_seconds / 60))
+
+@traced("reserve_slot")
+def reserve_slot(slot_index, memory, session_id):
+    # The slot is normally held since it was listed or picked; holding it again
+    # extends that hold (or takes the slot if it is still free). Confirm the hold
+    # before writing the calendar event, so losing either race never leaves an
+    # event behind; a failed insert gives the slot back.
+    choices = memory.get("slot_choices") or []
+    if slot_index >= len(choices):
+        offer_slots(memory, session_id)
+        return "Those slots have changed. Please ask for the available slots again."
+    doctor, slot_start = choices[slot_index]
+    calendar_id = DOCTOR_CALENDARS.get(doctor, "primary")
+    start = datetime.fromisoformat(slot_start)
+    start_time = start.strftime(SLOT_FORMAT)
+
+    version = hold_slot(slot_index, memory, session_id)
+    if version is None:
+        offer_slots(memory, session_id)
+        return "Sorry, that slot was just taken by another patient. Please ask for the available slots again."
+    if not slot_reservations.confirm(calendar_id, slot_start, session_id, version):
+        offer_slots(memory, session_id)
+        return "Sorry, your hold on that slot expired and it was taken. Please ask for the available slots again."
+    memory.pop("held_slot", None)
+    try:
+        book_appointment(doctor or "your doctor", start.date().isoformat(), start.strftime("%H:%M"))
+    except Exception as e:
+        slot_reservations.cancel(calendar_id, slot_start, session_id)
+        print("Booking error:", e)
+        return "Sorry, I couldn't book that slot right now. Please try again in a moment."
+    slot_reservations.complete(calendar_id, slot_start, session_id)
+    remove_slot(calendar_id, start)
+
+    memory["last_appointment"] = memory["available_slots"][slot_index]
+    memory["last_topic"] = "booking_confirmed"
+    memory["available_slots"] = []
+    memory["slot_choices"] = []
+    doctor = doctor or "your doctor"
+    event_link = "https://calendar.google.com"  # Placeholder for actual event link.
+    notify("", "",
+           "Grace Appointment Confirmation",
+           f" Your appointment with {doctor} is confirmed for {start_time}.\nView it here: {event_link}",
+           sms_body=f" Confirmed: {doctor} at {start_time}")
+    return f" Your appointment with {doctor} is confirmed! Reminders sent."
 
 # --- Flask API Endpoint ---
-@app.route('/chat', methods=['POST'])
+@grace.route('/chat', methods=['POST'])
 def chat():
-    data = request.get_json()
+    # Every stage below is timed into the request's trace, returned as a Server-Timing header.
+    trace = start_trace("/chat")
+    response = None
+    try:
+        response = make_response(handle_chat(request.get_json()))
+    finally:
+        trace = finish_trace(trace, "/chat", response.status_code if response is not None else 500)
+    if trace is not None:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+def handle_chat(data):
+    session_id = get_session_id(data)
+    limited = check_rate_limit(session_id)
+    if limited is not None:
+        return limited
+    if data.get("partial"):
+        # Interim voice transcript: preview the intent only, with no side effects on the session.
+        return jsonify({"partial": True, "intent": classify_intent(data.get("message", "")).intent})
+    with span("session_load"):
+        memory = session_store.get(session_id)
+    response = make_response(respond(data, memory, session_id))
+    with span("session_save"):
+        session_store.save(session_id, memory)
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    response.headers["X-Session-Id"] = session_id
+    return response
+
+def respond(data, memory, session_id):
     user_input = data.get("message", "").strip()
     user_input_lower = user_input.lower()
-    user_id = "default"
-    memory = session_memory[user_id]
+
+    # -- Determine the User's Intent (and entities) in one pass --
+    with span("intent"):
+        match = classify_intent(user_input)
+    tag("intent", match.intent)
 
     # -- Confirmation Check --
-    confirmation_phrases = ["yes", "confirm", "book", "go ahead", "okay", "sure", "please do", "sounds good"]
-    if any(phrase in user_input_lower for phrase in confirmation_phrases) and memory.get("available_slots"):
-        slot_text = memory["available_slots"][0]
-        try:
-            # Expected format: "Tuesday, April 01, 2025 at 09:00 AM with Dr. Smith"
-            start_time, doctor = slot_text.split(" with ")
-        except ValueError:
-            start_time = slot_text
-            doctor = "your doctor"
-        
-        event_link = "https://calendar.google.com"  # Placeholder for actual calendar event link.
-        send_email("",
-                   "Grace Appointment Confirmation",
-                   f" Your appointment with {doctor} is confirmed for {start_time}.\nView it here: {event_link}")
-        send_sms("", f" Confirmed: {doctor} at {start_time}")
-        response_text = f" Your appointment with {doctor} is confirmed! Reminders sent."
-        return jsonify({"response": response_text})
+    if match.is_confirmation and memory.get("available_slots"):
+        # "yes, slot 2" books the slot named; a plain "yes" books the one being held (else the first).
+        slot_index = match.slot_number - 1 if match.slot_number is not None else memory.get("held_slot") or 0
+        if 0 <= slot_index < len(memory["available_slots"]):
+            return jsonify({"response": reserve_slot(slot_index, memory, session_id)})
+        return jsonify({"response": "I couldn't find that slot. Please check the available slots and try again."})
+
+    # -- Slot Choice ("slot 2" with no confirmation): hold it while the patient decides --
+    if match.intent == "unknown" and match.slot_number is not None and memory.get("available_slots"):
+        slot_index = match.slot_number - 1
+        if not 0 <= slot_index < len(memory["available_slots"]):
+            return jsonify({"response": "I couldn't find that slot. Please check the available slots and try again."})
+        if hold_slot(slot_index, memory, session_id) is None:
+            offer_slots(memory, session_id)
+            return jsonify({"response": "Sorry, that slot was just taken by another patient. Please ask for the available slots again."})
+        return jsonify({"response": f"I'm holding slot {slot_index + 1} ({memory['available_slots'][slot_index]}) "
+                                    f"for you for {hold_minutes()} minutes. Type 'confirm' to book it."})
 
-    # -- Determine the User's Intent --
-    intent = get_user_intent(user_input)
+    intent = match.intent
 
     if intent == "provide_name":
-        # Extract name from phrases like "my name is ..." etc.
-        name_match = re.search(r"my name is\s+([a-zA-Z]+)", user_input, re.IGNORECASE)
-        if name_match:
-            memory["name"] = name_match.group(1).capitalize()
+        # Name comes from phrases like "my name is ..."
+        if match.name:
+            memory["name"] = match.name
             return jsonify({"response": f"Nice to meet you, {memory['name']}! How are you feeling today? Feel free to share any symptoms."})
         else:
             return jsonify({"response": "I didn't catch your name clearly. Could you please repeat it?"})
@@ -334,42 +542,33 @@ def chat():
             return jsonify({"response": "Hello! How can I assist you today? Could you please tell me your name?"})
 
     elif intent == "symptom":
+        note_symptoms(memory, user_input)
+        if wants_stream(data):
+            return stream_reply(generate_response_stream(symptom_prompt(user_input),
+                                                         cache_key=symptom_cache_key(user_input)))
         response_text = handle_symptoms(user_input, memory)
         return jsonify({"response": response_text})
 
     elif intent == "book_appointment":
-        slots = fetch_google_calendar_slots()
-        memory["available_slots"] = slots
+        slots = offer_slots(memory, session_id)
         if slots:
+            # Hold the first slot straight away, so it is still free when the patient confirms.
+            held = " (held for you)" if hold_slot(0, memory, session_id) is not None else ""
             return jsonify({"response": "Here are some available slots:\n" + "\n".join(slots) +
-                                        "\nPlease type 'confirm' (or a similar phrase) to book the first available slot."})
+                                        f"\nPlease type 'confirm' (or a similar phrase) to book the first available slot{held}, "
+                                        "or 'slot' and a number to pick another."})
         else:
             return jsonify({"response": "No available slots at the moment. Please try again later."})
 
     elif intent == "confirm_booking":
-        # Try to extract a slot number from the user input (e.g., "slot 2" or "2")
-        slot_match = re.search(r'slot\s*(\d+)', user_input_lower)
-        if slot_match:
-            slot_index = int(slot_match.group(1)) - 1  # Convert to zero-based index.
+        # Slot number from the user input (e.g., "slot 2")
+        if match.slot_number is not None:
+            slot_index = match.slot_number - 1  # Convert to zero-based index.
         else:
-            slot_index = 0  # Default to the first slot if no number is found.
-
-        if memory.get("available_slots") and slot_index < len(memory["available_slots"]):
-            slot_text = memory["available_slots"][slot_index]
-            try:
-                # Expected format: "Tuesday, April 01, 2025 at 09:00 AM with Dr. Smith"
-                start_time, doctor = slot_text.split(" with ")
-            except ValueError:
-                start_time = slot_text
-                doctor = "your doctor"
-            
-            event_link = "https://calendar.google.com"  # Placeholder for actual event link.
-            send_email("",
-                       "Grace Appointment Confirmation",
-                       f" Your appointment with {doctor} is confirmed for {start_time}.\nView it here: {event_link}")
-            send_sms("", f" Confirmed: {doctor} at {start_time}")
-            response_text = f" Your appointment with {doctor} is confirmed! Reminders sent."
-            return jsonify({"response": response_text})
+            slot_index = memory.get("held_slot") or 0  # Default to the held (else first) slot if no number is found.
+
+        if memory.get("available_slots") and 0 <= slot_index < len(memory["available_slots"]):
+            return jsonify({"response": reserve_slot(slot_index, memory, session_id)})
         else:
             return jsonify({"response": "I couldn't find that slot. Please check the available slots and try again."})
 
@@ -377,8 +576,7 @@ def chat():
         return jsonify({"response": "Your appointment has been cancelled."})
 
     elif intent == "reschedule_appointment":
-        slots = fetch_google_calendar_slots()  # Retrieve new available slots.
-        memory["available_slots"] = slots      # Store them in memory.
+        slots = offer_slots(memory, session_id)  # Retrieve new available slots and store them in memory.
         if slots:
             return jsonify({"response": "Here are your available slots for rescheduling:\n" +
                                         "\n".join(slots) +
@@ -415,17 +613,23 @@ def chat():
                         time_str = time_match.group(0)
                     else:
                         time_str = "08:00 AM"  # default fallback
-                        
-                    times_per_day = 1  # default to 1 tablet per day
+
+                    # Every time the patient mentioned becomes its own reminder.
+                    dose_times = parse_dose_times(memory["med_setup"]["schedule_info"]) or [DEFAULT_DOSE_TIME]
+                    times_per_day = len(dose_times)
                     duration_days = 30  # default duration, or you could ask the user for this detail
-                    
+
+                    upsert_patient(session_id, name=memory.get("name"))
                     add_medication(
                         medication_name,
                         dosage,
                         times_per_day,
                         duration_days,
-                        memory["med_setup"]["schedule_info"]
+                        memory["med_setup"]["schedule_info"],
+                        patient_id=session_id,
+                        dose_times=dose_times
                     )
+                    reminder_engine.wake()
                     del memory["med_setup"]
                     return jsonify({"response": f"All set! I'll remind you to take {medication_name} at {time_str} every day."})
                 else:
@@ -451,42 +655,122 @@ def chat():
 
     else:
         # ----- Custom Fallback Branch -----
-        formatted_slots = ""
-        if memory.get("available_slots"):
-            formatted_slots = "\n".join(memory["available_slots"])
-
         if any(x in user_input_lower for x in ["my name is", "i'm", "i am"]):
             parts = user_input.split()
             for i, word in enumerate(parts):
                 if word.lower() in ["is", "i'm", "i", "am"] and i + 1 < len(parts):
                     memory["name"] = parts[i + 1].capitalize()
-        for word in user_input.split():
-            if word not in memory["symptoms"]:
-                memory["symptoms"].append(word)
-
-        name_part = f"Patient's name is {memory['name']}.\n" if memory.get("name") else ""
-        symptom_part = f"Recent symptoms mentioned: {', '.join(memory['symptoms'])}\n" if memory.get("symptoms") else ""
-        prompt = (
-            f"{name_part}{symptom_part}"
-            f"The patient says: '{user_input}'.\n"
-            f"Here are upcoming available appointment slots:\n{formatted_slots}\n\n"
-            f"Provide empathetic healthcare advice. Suggest a slot if appropriate. Use the patient's name if known."
-        )
-        response_text = generate_response(prompt)
-        log_symptom(user_input, response_text)
-        return jsonify({"response": response_text})
-
-@app.route("/")
+        note_symptoms(memory, user_input)
+
+        # Bounded context: known symptoms, a rolling summary of the conversation and the best few slots.
+        with span("build_prompt"):
+            prompt, token_counts = build_prompt(memory, user_input, memory.get("available_slots", []))
+        prompt_stats.record(token_counts)
+        record_turn(memory, user_input)
+        if wants_stream(data):
+            def on_complete(text):
+                # Runs after handle_chat has saved the session, and maybe after later
+                # turns have too: add just this reply to the session as it is now.
+                if text and session_id in session_store:
+                    current = session_store.get(session_id)
+                    if record_reply(current, text, user_input):
+                        session_store.save(session_id, current)
+                log_symptom(user_input, text)
+            response = stream_reply(generate_response_stream(prompt), on_complete=on_complete)
+        else:
+            response_text = generate_response(prompt)
+            record_reply(memory, response_text)
+            log_symptom(user_input, response_text)
+            response = jsonify({"response": response_text})
+        response.headers["X-Prompt-Tokens"] = str(token_counts["prompt_tokens"])
+        return response
+
+def is_admin():
+    expected = f"Bearer {ADMIN_TOKEN}".encode()
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected)
+
+@grace.route('/medications/import', methods=['POST'])
+def medications_import():
+    # Bulk prescriptions as CSV (Content-Type: text/csv) or JSON lines; see medication_import.py for the fields.
+    # Admin only (Authorization: Bearer $GRACE_ADMIN_TOKEN). Stored contact details are kept
+    # unless the request asks for ?update_contacts=1.
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Medication import is disabled; set GRACE_ADMIN_TOKEN to enable it."}), 404
+    if not is_admin():
+        return jsonify({"error": "Admin token required."}), 401, {"WWW-Authenticate": "Bearer"}
+    fmt = "csv" if "csv" in (request.content_type or "") else "jsonl"
+    update_contacts = request.args.get("update_contacts", "").lower() in ("1", "true", "yes")
+    stream = decode_lines(request.stream)
+    # The engine reloads its schedule once, after the last chunk is written.
+    result = import_medications(read_records(stream, fmt), register=reminder_engine.wake,
+                                update_contacts=update_contacts)
+    # Unreadable input is a 400 naming the line; rows before it are imported and counted.
+    if result.unreadable is not None:
+        return jsonify(result.as_dict()), 400
+    return jsonify(result.as_dict()), (200 if result.imported or not result.rejected else 400)
+
+@grace.route('/chat/latency', methods=['GET'])
+def chat_latency():
+    # Time-to-first-byte and total LLM latency over the recent window, in seconds.
+    return jsonify(get_llm_client().latency.snapshot())
+
+@grace.route('/chat/context', methods=['GET'])
+def chat_context():
+    # Prompt sizes for open-ended replies over the recent window, in tokens.
+    return jsonify(prompt_stats.snapshot())
+
+@grace.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus scrape endpoint.
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+def collect_component_metrics():
+    # Counters the cache, conversation log, reminder engine and notifier already keep, read at scrape time.
+    cache = response_cache.stats()
+    return [
+        ("grace_response_cache_requests_total", "counter", "LLM response cache lookups.",
+         [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+        ("grace_response_cache_entries", "gauge", "Replies held in the response cache.", [({}, cache["entries"])]),
+        ("grace_conversation_log_rows_total", "counter", "Conversation log rows by outcome.",
+         [({"outcome": "written"}, conversation_log.written), ({"outcome": "dropped"}, conversation_log.dropped),
+          ({"outcome": "failed"}, conversation_log.failed)]),
+        ("grace_reminders_total", "counter", "Medication reminders by outcome.",
+         [({"outcome": "sent"}, reminder_engine.sent), ({"outcome": "failed"}, reminder_engine.failed),
+          ({"outcome": "retried"}, reminder_engine.retried)]),
+    ]
+
+registry.collector(collect_component_metrics)
+
+@grace.route("/")
 def index():
-    return app.send_static_file('index.html')
-
-# --- Scheduler Initialization ---
-scheduler = BackgroundScheduler()
-scheduler.add_job(send_daily_medication_reminders, 'cron', hour=8, minute=0)
-scheduler.add_job(speak_night_reminders, 'cron', hour=21, minute=0)
-scheduler.start()
-
-if __name__ == '__main__':
+    return current_app.send_static_file('index.html')
+
+# --- Reminder Engine ---
+# Sends each patient's doses at the times they gave; safe to run in several processes.
+reminder_engine = ReminderEngine(dispatch_reminders)
+scheduler_lock = LeaderLock()
+
+def start_scheduler(mode=SCHEDULER_MODE):
+    # Only one process per host should run the engine, e.g. one of several Gunicorn workers.
+    if mode == "off":
+        return False
+    if mode == "on":
+        reminder_engine.start()
+        return True
+    return run_as_leader(scheduler_lock, reminder_engine.start)
+
+# --- Application Factory ---
+def create_app(scheduler=SCHEDULER_MODE):
+    # e.g. gunicorn "grace_chatbot_gui:create_app()"
+    app = Flask(__name__, static_folder="static", template_folder="templates")
+    CORS(app)
+    app.register_blueprint(grace)
     init_db()
     init_medication_db()
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    slot_reservations.init()
+    start_scheduler(scheduler)
+    return app
+
+if __name__ == '__main__':
+    app = create_app()
+    app.run(debug=True, port=5000)
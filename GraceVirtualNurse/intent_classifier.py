@@ -0,0 +1,98 @@
+import re
+from collections import namedtuple
+
+# --- Keyword Tables ---
+SYMPTOM_KEYWORDS = ["headache", "fever", "cough", "pain", "stuffy", "sore throat", "chills", "sore"]
+GREETING_KEYWORDS = ["hi", "hello", "hey"]
+AGREEMENT_PHRASES = ["yes", "go ahead", "okay", "sure", "please do", "sounds good"]
+
+# Keyword -> the flag it raises. Matched keywords are looked up here instead
+# of being re-scanned per intent.
+KEYWORD_FLAGS = {"summary": "summary", "confirm": "confirm", "cancel": "cancel",
+                 "reschedule": "reschedule", "book": "book", "appointment": "appointment",
+                 "remind": "remind", "medication": "remind"}
+KEYWORD_FLAGS.update((word, "symptom") for word in SYMPTOM_KEYWORDS)
+KEYWORD_FLAGS.update((word, "greeting") for word in GREETING_KEYWORDS)
+KEYWORD_FLAGS.update((phrase, "agree") for phrase in AGREEMENT_PHRASES)
+
+
+def _alternation(words):
+    # Longest first so "sore throat" wins over "sore" at the same position.
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# One pattern, evaluated once per lowercased message. Keywords can overlap
+# ("go aheadache", "yesummary"), so the alternation sits in a lookahead: it
+# consumes nothing and is tried at every position, and findall returns the
+# keyword starting there. At one position the longest keyword wins, which only
+# matters for prefix pairs such as "sore"/"sore throat" that raise the same flag.
+# The leading first-letter class lets the engine skip most positions cheaply.
+_FIRST_LETTERS = "".join(sorted({word[0] for word in KEYWORD_FLAGS} | {"m", "s"}))
+_INTENT_PATTERN = re.compile(
+    r"(?=[" + re.escape(_FIRST_LETTERS) + r"])"
+    r"(?=(my name is"
+    r"|slot\s*\d+"
+    r"|(?<!\S)(?:" + _alternation(GREETING_KEYWORDS) + r")(?!\S)"
+    r"|" + _alternation([k for k in KEYWORD_FLAGS if k not in GREETING_KEYWORDS]) +
+    r"))"
+)
+
+# The name is read separately, only for messages that contain "my name is", so
+# the word after it still goes through the keyword scan ("my name is Yesenia"
+# is an agreement, "my name is summary" a summary, as with the original checks).
+_NAME_PATTERN = re.compile(r"my name is\s+([a-z]+)")
+
+IntentMatch = namedtuple("IntentMatch", ["intent", "name", "slot_number", "symptoms", "is_confirmation"])
+
+
+def classify_intent(user_input):
+    # Returns the intent plus the entities found along the way, in a single
+    # scan of the message. Intent priority matches the original rule order.
+    text = user_input.lower().strip()
+    found = set()
+    name = None
+    slot_number = None
+    symptoms = []
+
+    for token in _INTENT_PATTERN.findall(text):
+        flag = KEYWORD_FLAGS.get(token)
+        if flag is None:
+            if token == "my name is":
+                flag = "name"
+            else:
+                flag = "slot"
+                if slot_number is None:
+                    slot_number = int(token[4:])
+        elif flag == "symptom" and token not in symptoms:
+            symptoms.append(token)
+        found.add(flag)
+
+    if "name" in found:
+        name_match = _NAME_PATTERN.search(text)
+        if name_match:
+            name = name_match.group(1).capitalize()
+
+    if "summary" in found:
+        intent = "summary"
+    elif "name" in found:
+        intent = "provide_name"
+    elif "symptom" in found:
+        intent = "symptom"
+    elif "greeting" in found:
+        intent = "greeting"
+    elif "confirm" in found or text in ("yes", "y"):
+        intent = "confirm_booking"
+    elif "book" in found or "appointment" in found:
+        if "cancel" in found:
+            intent = "cancel_appointment"
+        elif "reschedule" in found:
+            intent = "reschedule_appointment"
+        else:
+            intent = "book_appointment"
+    elif "remind" in found:
+        intent = "medication_reminder"
+    else:
+        intent = "unknown"
+
+    is_confirmation = bool(found & {"confirm", "book", "agree"})
+    return IntentMatch(intent, name, slot_number, symptoms, is_confirmation)
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Configurations ---
+SCHEDULER_LOCK_PATH = os.getenv("GRACE_SCHEDULER_LOCK", "grace_scheduler.lock")
+LEADER_RETRY_SECONDS = float(os.getenv("GRACE_SCHEDULER_RETRY_SECONDS", "30"))
+
+
+class LeaderLock:
+    # Non-blocking exclusive lock on a file, used to pick the one process on a
+    # host that runs background jobs. The OS drops the lock when the holder
+    # exits, so a standby process can take over.
+
+    def __init__(self, path=SCHEDULER_LOCK_PATH):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        with self._lock:
+            if self._file is not None:
+                return True
+            handle = open(self.path, "a+")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                handle.close()
+                return False
+            handle.seek(0)
+            handle.truncate()
+            handle.write(str(os.getpid()))
+            handle.flush()
+            self._file = handle
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+
+
+def run_as_leader(lock, start, retry_seconds=LEADER_RETRY_SECONDS):
+    # Calls start() now if this process gets the lock; otherwise a daemon
+    # thread keeps trying and calls it if the current leader goes away.
+    if lock.try_acquire():
+        start()
+        return True
+
+    def standby():
+        while True:
+            time.sleep(retry_seconds)
+            if lock.try_acquire():
+                start()
+                return
+
+    threading.Thread(target=standby, name="grace-leader-standby", daemon=True).start()
+    return False
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS_ENABLED, registry
+
+# --- Configurations ---
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+LLM_MODEL = os.getenv("GRACE_LLM_MODEL", "gpt-3.5-turbo")
+LLM_MAX_IN_FLIGHT = int(os.getenv("GRACE_LLM_MAX_IN_FLIGHT", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("GRACE_LLM_QUEUE_TIMEOUT", "5"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("GRACE_LLM_CONNECT_TIMEOUT", "3"))
+LLM_READ_TIMEOUT = float(os.getenv("GRACE_LLM_READ_TIMEOUT", "30"))
+
+SYSTEM_PROMPT = "You are Grace, a helpful healthcare chatbot for Grace Hospital."
+
+LLM_TOKENS = registry.counter("grace_llm_tokens_total", "LLM tokens, as reported by the API or estimated.",
+                              ("kind",))
+LLM_REQUESTS = registry.counter("grace_llm_requests_total", "LLM calls by mode and outcome.", ("mode", "outcome"))
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMOverloadedError(LLMError):
+    # Raised when every in-flight slot is taken for longer than the queue timeout.
+    pass
+
+
+class LatencyStats:
+    # Rolling window of time-to-first-byte and total latency, in seconds.
+
+    def __init__(self, window=1000):
+        self._ttfb = deque(maxlen=window)
+        self._total = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ttfb, total):
+        with self._lock:
+            self._ttfb.append(ttfb)
+            self._total.append(total)
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        with self._lock:
+            ttfb, total = list(self._ttfb), list(self._total)
+        return {
+            "count": len(total),
+            "ttfb_p50": self._percentile(ttfb, 50),
+            "ttfb_p95": self._percentile(ttfb, 95),
+            "total_p50": self._percentile(total, 50),
+            "total_p95": self._percentile(total, 95),
+        }
+
+
+class LLMClient:
+    # Chat completion client shared by every request thread.
+    # One keep-alive HTTP session is reused for all calls, and a semaphore caps
+    # how many completions can be waiting on the model at the same time.
+
+    def __init__(self, api_key=None, api_base=OPENAI_API_BASE, model=LLM_MODEL,
+                 max_in_flight=LLM_MAX_IN_FLIGHT, queue_timeout=LLM_QUEUE_TIMEOUT,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY", "")
+        self.api_base = api_base.rstrip("/")
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.timeout = (connect_timeout, read_timeout)
+
+        # requests is only imported once a client is actually built.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._request_error = requests.RequestException
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.latency = LatencyStats()
+
+    def _payload(self, prompt, max_tokens, temperature, stream=False):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": stream,
+        }
+
+    def _count_tokens(self, prompt, completion_text="", completion_tokens=0, usage=None):
+        # Prefers the API's usage block; otherwise the texts are estimated and
+        # each streamed delta is counted as one token.
+        if not METRICS_ENABLED:
+            return
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens", 0), "prompt")
+            LLM_TOKENS.inc(usage.get("completion_tokens", 0), "completion")
+            return
+        from context_builder import count_tokens
+        LLM_TOKENS.inc(count_tokens(SYSTEM_PROMPT) + count_tokens(prompt), "prompt")
+        LLM_TOKENS.inc(completion_tokens or count_tokens(completion_text), "completion")
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            LLM_REQUESTS.inc(1, "any", "overloaded")
+            raise LLMOverloadedError(
+                f"More than {self.max_in_flight} LLM calls in flight for {self.queue_timeout}s"
+            )
+
+    def complete(self, prompt, max_tokens=200, temperature=0.7):
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            response = self._session.post(
+                f"{self.api_base}/chat/completions",
+                json=self._payload(prompt, max_tokens, temperature),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (self._request_error, ValueError) as e:  # ValueError: a body that is not JSON
+            LLM_REQUESTS.inc(1, "complete", "error")
+            raise LLMError(f"LLM request failed: {e}") from e
+        finally:
+            self._slots.release()
+        # A 200 whose body is an error object or otherwise not a completion.
+        try:
+            content = data["choices"][0]["message"]["content"].strip()
+        except (LookupError, TypeError, AttributeError) as e:
+            LLM_REQUESTS.inc(1, "complete", "error")
+            raise LLMError(f"LLM returned an unexpected response: {e!r}") from e
+        elapsed = time.perf_counter() - started
+        self.latency.record(elapsed, elapsed)
+        LLM_REQUESTS.inc(1, "complete", "ok")
+        self._count_tokens(prompt, completion_text=content, usage=data.get("usage"))
+        return content
+
+    def stream(self, prompt, max_tokens=200, temperature=0.7):
+        # Yields content deltas as the model produces them (OpenAI server-sent events).
+        # The in-flight slot is held until the stream is exhausted or closed.
+        self._acquire()
+        started = time.perf_counter()
+        first_token_at = None
+        deltas = 0
+        outcome = "closed"  # the caller stopped reading before the end
+        try:
+            try:
+                response = self._session.post(
+                    f"{self.api_base}/chat/completions",
+                    json=self._payload(prompt, max_tokens, temperature, stream=True),
+                    timeout=self.timeout,
+                    stream=True,
+                )
+                response.raise_for_status()
+            except self._request_error as e:
+                outcome = "error"
+                raise LLMError(f"LLM request failed: {e}") from e
+
+            with response:
+                # A timeout or dropped connection mid-stream, or a malformed
+                # chunk, surfaces as LLMError like a failed request.
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        delta = json.loads(data)["choices"][0].get("delta", {})
+                        token = delta.get("content")
+                        if token:
+                            deltas += 1
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            yield token
+                except (self._request_error, ValueError, LookupError, TypeError, AttributeError) as e:
+                    outcome = "error"
+                    raise LLMError(f"LLM stream failed: {e}") from e
+                outcome = "ok"
+        finally:
+            self._slots.release()
+            if outcome != "ok" or first_token_at is None:
+                LLM_REQUESTS.inc(1, "stream", outcome if outcome != "ok" else "empty")
+            else:
+                self.latency.record(first_token_at - started, time.perf_counter() - started)
+                LLM_REQUESTS.inc(1, "stream", "ok")
+                self._count_tokens(prompt, completion_tokens=deltas)
+
+    def submit(self, prompt, max_tokens=200, temperature=0.7):
+        # Non-blocking variant: returns a concurrent.futures.Future.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight, thread_name_prefix="grace-llm"
+                )
+        return self._executor.submit(self.complete, prompt, max_tokens, temperature)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
@@ -0,0 +1,278 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from db import get_pool
+from medication_reminder import (DEFAULT_DOSE_TIME, FILL_PATIENT, INSERT_MEDICATION, UPSERT_PATIENT,
+                                 init_medication_db, parse_dose_times)
+
+# --- Configurations ---
+IMPORT_CHUNK_SIZE = int(os.getenv("GRACE_IMPORT_CHUNK_SIZE", "1000"))  # rows per transaction
+DEFAULT_DURATION_DAYS = 30
+MAX_DURATION_DAYS = 366
+MAX_REPORTED_ERRORS = 100
+
+# Bulk prescription import, e.g. a ward's medications at onboarding:
+#   python medication_import.py prescriptions.csv
+#   python medication_import.py prescriptions.jsonl --dry-run
+# One record per CSV row or JSON line, with these fields (only patient_id and
+# name are required):
+#   patient_id, name, dosage, dose_times ("8:00 AM, 6 PM" or a JSON list),
+#   duration_days, start_date (YYYY-MM-DD, default today), times_per_day,
+#   notes, patient_name, email, phone
+# Records are validated as they stream in and written with executemany, one
+# transaction per chunk. Patients already on file keep their name, email and
+# phone (an import only fills blanks) unless --update-contacts is given. A
+# running reminder engine picks the new doses up on its next refresh;
+# POST /medications/import wakes it immediately.
+
+
+class RecordError(ValueError):
+    pass
+
+
+class UnreadableInput(ValueError):
+    # The stream itself could not be read (invalid UTF-8, broken CSV quoting);
+    # nothing from line_number on can be imported.
+
+    def __init__(self, line_number, message):
+        super().__init__(message)
+        self.line_number = line_number
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path}; pass --format csv or jsonl")
+
+
+def decode_lines(stream, encoding="utf-8", block_size=65536):
+    # Text lines from a binary stream, read in blocks but decoded one line at
+    # a time, so a decoding error surfaces at the line that has it
+    # (io.TextIOWrapper decodes whole blocks and fails lines early).
+    pending = b""
+    for block in iter(lambda: stream.read(block_size), b""):
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode(encoding) + "\n"
+    if pending:
+        yield pending.decode(encoding)
+
+
+def read_records(stream, fmt):
+    # Yields (line number, record dict) from an open text stream. Raises
+    # UnreadableInput at the first line that cannot be decoded or parsed as CSV.
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as e:
+            raise UnreadableInput(reader.line_num, f"unreadable CSV: {e}") from e
+        except UnicodeDecodeError as e:
+            raise UnreadableInput(reader.line_num + 1, f"not valid UTF-8: {e.reason}") from e
+    elif fmt == "jsonl":
+        line_number = 0
+        try:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = RecordError(f"invalid JSON: {e}")
+                yield line_number, record
+        except UnicodeDecodeError as e:
+            raise UnreadableInput(line_number + 1, f"not valid UTF-8: {e.reason}") from e
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _field(record, name):
+    value = record.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in (None, "") else value
+
+
+def _int_field(record, name, default, low, high):
+    value = _field(record, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"{name} must be a whole number, got {value!r}")
+    if not low <= number <= high:
+        raise RecordError(f"{name} must be between {low} and {high}, got {number}")
+    return number
+
+
+class DoseTimes:
+    # parse_dose_times, run once per distinct schedule text: a ward's
+    # prescriptions share a handful of schedules.
+
+    def __init__(self):
+        self._parsed = {}
+
+    def __call__(self, text):
+        times = self._parsed.get(text)
+        if times is None:
+            times = self._parsed[text] = ",".join(parse_dose_times(text))
+        return times
+
+
+def validate_record(record, today, dose_times):
+    # Returns (medication row for INSERT_MEDICATION, patient row for FILL_PATIENT/UPSERT_PATIENT or None).
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise RecordError("record must be an object")
+    patient_id, name = _field(record, "patient_id"), _field(record, "name")
+    if patient_id is None:
+        raise RecordError("patient_id is required")
+    if name is None:
+        raise RecordError("name is required")
+
+    schedule = _field(record, "dose_times")
+    if isinstance(schedule, list):
+        schedule = ", ".join(str(t) for t in schedule)
+    if schedule is not None:
+        times = dose_times(str(schedule))
+        if not times:
+            raise RecordError(f"no dose times found in {schedule!r}")
+    else:
+        times = dose_times(str(_field(record, "notes") or "")) or DEFAULT_DOSE_TIME
+
+    duration_days = _int_field(record, "duration_days", DEFAULT_DURATION_DAYS, 1, MAX_DURATION_DAYS)
+    times_per_day = _int_field(record, "times_per_day", times.count(",") + 1, 1, 24)
+    start_text = _field(record, "start_date")
+    try:
+        start = date.fromisoformat(str(start_text)) if start_text is not None else today
+    except ValueError:
+        raise RecordError(f"start_date must be YYYY-MM-DD, got {start_text!r}")
+
+    medication = (str(name), str(_field(record, "dosage") or ""), times_per_day, start.isoformat(), duration_days,
+                  str(_field(record, "notes") or schedule or ""), (start + timedelta(days=duration_days)).isoformat(),
+                  str(patient_id), times)
+    contact = [_field(record, key) for key in ("patient_name", "email", "phone")]
+    patient = (str(patient_id), *contact) if any(value is not None for value in contact) else None
+    return medication, patient
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.chunks = 0
+        self.errors = []  # (line number, message), the first MAX_REPORTED_ERRORS
+        self.unreadable = None  # (line number, message) where reading the input stopped
+        self.seconds = 0.0
+
+    def reject(self, line_number, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def as_dict(self):
+        return {
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "errors": [{"line": line, "error": message} for line, message in self.errors],
+            "unreadable": None if self.unreadable is None else
+            {"line": self.unreadable[0], "error": self.unreadable[1]},
+            "rows_per_second": round(self.imported / self.seconds, 1) if self.seconds else None,
+        }
+
+
+def _write_chunk(pool, medications, patients, update_contacts):
+    with pool.connection() as conn:
+        if patients:
+            conn.executemany(UPSERT_PATIENT if update_contacts else FILL_PATIENT, patients.values())
+        conn.executemany(INSERT_MEDICATION, medications)
+
+
+def import_medications(records, chunk_size=IMPORT_CHUNK_SIZE, pool=None, today=None, dry_run=False,
+                       register=None, update_contacts=False):
+    # records: iterable of (line number, record) as from read_records. Invalid
+    # records are reported and skipped; valid ones are written chunk by chunk.
+    # If the input turns out to be unreadable part way, the valid records
+    # before that line are written and result.unreadable says where it stopped.
+    # register (e.g. reminder_engine.wake) is called once after the last chunk.
+    # update_contacts lets the records replace contact details already stored.
+    pool = pool or get_pool()
+    today = today or date.today()
+    dose_times = DoseTimes()
+    result = ImportResult()
+    started = time.perf_counter()
+    medications, patients = [], {}
+    try:
+        for line_number, record in records:
+            try:
+                medication, patient = validate_record(record, today, dose_times)
+            except RecordError as e:
+                result.reject(line_number, str(e))
+                continue
+            medications.append(medication)
+            if patient is not None:
+                previous = patients.get(patient[0])
+                if previous is not None:  # later details win, blanks keep earlier ones
+                    patient = tuple(new if new is not None else old for new, old in zip(patient, previous))
+                patients[patient[0]] = patient
+            if len(medications) >= chunk_size:
+                if not dry_run:
+                    _write_chunk(pool, medications, patients, update_contacts)
+                result.imported += len(medications)
+                result.chunks += 1
+                medications, patients = [], {}
+    except UnreadableInput as e:
+        # Everything before the unreadable line is still written below.
+        result.unreadable = (e.line_number, str(e))
+    if medications:
+        if not dry_run:
+            _write_chunk(pool, medications, patients, update_contacts)
+        result.imported += len(medications)
+        result.chunks += 1
+    result.seconds = time.perf_counter() - started
+    if register is not None and result.imported and not dry_run:
+        register()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import prescriptions into Grace's medication reminders")
+    parser.add_argument("path", help="CSV or JSONL file, or - for standard input")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    parser.add_argument("--update-contacts", action="store_true",
+                        help="replace stored patient names, emails and phones (default: only fill blanks)")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    init_medication_db()
+    if args.path == "-":
+        result = import_medications(read_records(decode_lines(sys.stdin.buffer), fmt), args.chunk_size,
+                                    dry_run=args.dry_run, update_contacts=args.update_contacts)
+    else:
+        with open(args.path, "rb") as stream:
+            result = import_medications(read_records(decode_lines(stream), fmt), args.chunk_size,
+                                        dry_run=args.dry_run, update_contacts=args.update_contacts)
+    for line_number, message in result.errors:
+        print(f"line {line_number}: {message}", file=sys.stderr)
+    if result.unreadable is not None:
+        print(f"line {result.unreadable[0]}: {result.unreadable[1]}; stopped reading there", file=sys.stderr)
+    action = "validated" if args.dry_run else "imported"
+    print(f"{result.imported} prescriptions {action}, {result.rejected} rejected, "
+          f"in {result.seconds:.2f}s ({result.as_dict()['rows_per_second'] or 0} rows/s)")
+    sys.exit(1 if result.rejected or result.unreadable else 0)
@@ -1,11 +1,91 @@
-import sqlite3
+import re
 from datetime import datetime, timedelta
+from db import get_pool
+
+DEFAULT_DOSE_TIME = "08:00"
+
+INSERT_MEDICATION = (
+    "INSERT INTO medications (name, dosage, times_per_day, start_date, duration_days, notes, end_date, "
+    "patient_id, dose_times) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# Active on a day: started on or before it and not yet ended. Only rows whose
+# end_date is still ahead are visited, so cost follows active prescriptions,
+# not the whole history.
+SELECT_ACTIVE_MEDICATIONS = (
+    "SELECT name, dosage, times_per_day FROM medications "
+    "WHERE end_date >= ? AND start_date <= ?"
+)
+SELECT_ACTIVE_PATIENT_MEDICATIONS = SELECT_ACTIVE_MEDICATIONS + " AND patient_id = ?"
+# Everything the reminder engine needs to dispatch a dose, for prescriptions
+# active at some point in [first_day, last_day].
+SELECT_DOSE_SCHEDULE = (
+    "SELECT m.id, m.name, m.dosage, m.start_date, m.end_date, m.dose_times, m.notes, "
+    "m.patient_id, p.name, p.email, p.phone "
+    "FROM medications m LEFT JOIN patients p ON p.patient_id = m.patient_id "
+    "WHERE m.end_date >= ? AND m.start_date <= ?"
+)
+UPSERT_PATIENT = (
+    "INSERT INTO patients (patient_id, name, email, phone) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(patient_id) DO UPDATE SET "
+    "name = COALESCE(excluded.name, name), "
+    "email = COALESCE(excluded.email, email), "
+    "phone = COALESCE(excluded.phone, phone)"
+)
+# The same, but stored details are kept and only blanks are filled: bulk
+# imports use this unless asked to update contact details.
+FILL_PATIENT = (
+    "INSERT INTO patients (patient_id, name, email, phone) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(patient_id) DO UPDATE SET "
+    "name = COALESCE(name, excluded.name), "
+    "email = COALESCE(email, excluded.email), "
+    "phone = COALESCE(phone, excluded.phone)"
+)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+MIGRATIONS = [
+    # 1: computed end date and per-patient ownership, indexed for the active-medication query.
+    [
+        "ALTER TABLE medications ADD COLUMN end_date TEXT",
+        "ALTER TABLE medications ADD COLUMN patient_id TEXT",
+        "UPDATE medications SET end_date = date(start_date, '+' || duration_days || ' days')",
+        "CREATE INDEX IF NOT EXISTS idx_medications_active ON medications (end_date, start_date)",
+        "CREATE INDEX IF NOT EXISTS idx_medications_patient_active "
+        "ON medications (patient_id, end_date, start_date)",
+    ],
+    # 2: per-dose times, patient contact details and the reminder dispatch ledger.
+    [
+        "ALTER TABLE medications ADD COLUMN dose_times TEXT",
+        '''CREATE TABLE IF NOT EXISTS patients (
+            patient_id TEXT PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            phone TEXT
+        )''',
+        # One row per (medication, dose time); the primary key is what makes a
+        # dose go out once even with several processes running the engine.
+        '''CREATE TABLE IF NOT EXISTS reminder_dispatches (
+            medication_id INTEGER NOT NULL,
+            due_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at REAL,
+            next_attempt_at REAL,
+            PRIMARY KEY (medication_id, due_at)
+        )''',
+    ],
+    # 3: channels a dose has already gone out on, so a retry only resends the ones that failed.
+    [
+        "ALTER TABLE reminder_dispatches ADD COLUMN delivered TEXT NOT NULL DEFAULT ''",
+    ],
+]
 
 # Create medications table if it doesn’t exist
 def init_medication_db():
-    with sqlite3.connect("grace_hospital.db") as conn:
-        c = conn.cursor()
-        c.execute('''
+    with get_pool().connection() as conn:
+        # Worker processes start together; the write lock makes them migrate one at a time.
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS medications (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT,
@@ -16,33 +96,61 @@ def init_medication_db():
                 notes TEXT
             )
         ''')
-        conn.commit()
+        migrate_medication_db(conn)
+
+def migrate_medication_db(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {number}")
+
+# "8:00 AM and 6pm" -> ["08:00", "18:00"]
+_TIME_PATTERN = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\b|\b(\d{1,2}):(\d{2})\b", re.IGNORECASE)
+
+def parse_dose_times(text):
+    times = []
+    for hour12, minute12, meridiem, hour24, minute24 in _TIME_PATTERN.findall(text or ""):
+        if meridiem:
+            hour, minute = int(hour12) % 12, int(minute12 or 0)
+            if meridiem.lower() == "p":
+                hour += 12
+        else:
+            hour, minute = int(hour24), int(minute24)
+        if hour < 24 and minute < 60:
+            formatted = f"{hour:02d}:{minute:02d}"
+            if formatted not in times:
+                times.append(formatted)
+    return times
+
+def upsert_patient(patient_id, name=None, email=None, phone=None):
+    get_pool().execute(UPSERT_PATIENT, (patient_id, name, email, phone))
 
 # Add new medication and schedule reminders
-def add_medication(name, dosage, times_per_day, duration_days, notes=""):
-    start_date = datetime.now().date().isoformat()
-    with sqlite3.connect("grace_hospital.db") as conn:
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO medications (name, dosage, times_per_day, start_date, duration_days, notes) VALUES (?, ?, ?, ?, ?, ?)",
-            (name, dosage, times_per_day, start_date, duration_days, notes)
+def add_medication(name, dosage, times_per_day, duration_days, notes="", patient_id=None, dose_times=None):
+    start = datetime.now().date()
+    end = start + timedelta(days=duration_days)
+    dose_times = dose_times or parse_dose_times(notes) or [DEFAULT_DOSE_TIME]
+    with get_pool().connection() as conn:
+        cursor = conn.execute(
+            INSERT_MEDICATION,
+            (name, dosage, times_per_day, start.isoformat(), duration_days, notes, end.isoformat(),
+             patient_id, ",".join(dose_times))
         )
-        conn.commit()
-
-# Check and return reminders due today
-def get_today_medications():
-    today = datetime.now().date()
-    reminders = []
-    with sqlite3.connect("grace_hospital.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT name, dosage, times_per_day, start_date, duration_days FROM medications")
-        for name, dosage, times, start_str, duration in c.fetchall():
-            start = datetime.fromisoformat(start_str).date()
-            end = start + timedelta(days=duration)
-            # Check if today's date falls within the medication period
-            if start <= today <= end:
-                reminders.append(f"Take {dosage} of {name} - {times} times today")
-    return reminders
+        return cursor.lastrowid
+
+# Rows for every prescription active between first_day and last_day (dates)
+def get_dose_schedule(first_day, last_day):
+    return get_pool().query(SELECT_DOSE_SCHEDULE, (first_day.isoformat(), last_day.isoformat()))
+
+# Check and return reminders due today (or on `day`), optionally for one patient
+def get_today_medications(patient_id=None, day=None):
+    day = (day or datetime.now().date()).isoformat()
+    if patient_id is None:
+        rows = get_pool().query(SELECT_ACTIVE_MEDICATIONS, (day, day))
+    else:
+        rows = get_pool().query(SELECT_ACTIVE_PATIENT_MEDICATIONS, (day, day, patient_id))
+    return [f"Take {dosage} of {name} - {times} times today" for name, dosage, times in rows]
 
 # Example usage:
 if __name__ == '__main__':
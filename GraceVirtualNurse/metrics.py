@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# --- Configurations ---
+METRICS_ENABLED = os.getenv("GRACE_METRICS", "1") != "0"
+SLOW_REQUEST_MS = float(os.getenv("GRACE_SLOW_REQUEST_MS", "0"))  # print the stage breakdown of slower requests
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Counters and histograms kept in process and rendered in the Prometheus text
+# format for /metrics. Each /chat request carries a trace (through a context
+# variable) that collects the time spent in every span, so one slow request
+# can be broken down by stage. With GRACE_METRICS=0 spans are a shared no-op
+# and decorated functions are left untouched.
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    # Monotonic count per combination of label values: inc(amount, *labels).
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    # Fixed-bucket distribution per combination of label values: observe(value, *labels).
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts..., overflow count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def count(self, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            return sum(entry[:-1]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(entry) for key, entry in self._values.items()}
+        samples = []
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket",
+                                _format_labels(self.labels, key, [("le", _format_value(bound))]), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), entry[-1]))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), cumulative))
+        return samples
+
+
+class Registry:
+    # Metrics owned here plus collectors, callables returning
+    # [(name, kind, help, [(labels dict, value), ...]), ...] read at scrape time
+    # from stats the components already keep.
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, collect):
+        with self._lock:
+            self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print("Error collecting metrics:", str(e))
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = registry.histogram("grace_stage_seconds", "Time spent in each stage of handling a request.",
+                                   ("stage",))
+STAGE_ERRORS = registry.counter("grace_stage_errors_total", "Stages that ended with an exception.", ("stage",))
+REQUEST_SECONDS = registry.histogram("grace_request_seconds", "End-to-end request latency.", ("route",))
+REQUESTS = registry.counter("grace_requests_total", "Requests served.", ("route", "status"))
+
+
+# --- Tracing ---
+_current_trace = contextvars.ContextVar("grace_trace", default=None)
+
+
+class Trace:
+    # The spans of one request, in the order they finished, as
+    # (stage, offset from the start of the request, duration) in seconds.
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.tags = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stages(self):
+        # Total seconds per stage, in first-seen order.
+        totals = {}
+        for stage, _, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration
+        return totals
+
+    def server_timing(self):
+        # Server-Timing header value, which browser dev tools show per request.
+        parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages().items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+    def describe(self):
+        tags = " ".join(f"{key}={value}" for key, value in self.tags.items())
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in self.stages().items())
+        return f"{self.name} {self.elapsed() * 1000:.1f}ms {tags} [{stages}]".replace("  ", " ")
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        finished = time.perf_counter()
+        duration = finished - self.started
+        STAGE_SECONDS.observe(duration, self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(1, self.stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.stage, self.started - trace.started, duration))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    # with span("generate_response"): ...
+    return _Span(stage) if METRICS_ENABLED else _NULL_SPAN
+
+
+def traced(stage):
+    # Decorator form of span(); returns the function unchanged when metrics are off.
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_trace(name):
+    # Makes a new trace current for this request; pass the result to finish_trace().
+    if not METRICS_ENABLED:
+        return None
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+def finish_trace(started, route, status):
+    # Records the request and returns its trace (None when metrics are off).
+    if started is None:
+        return None
+    trace, token = started
+    _current_trace.reset(token)
+    elapsed = trace.elapsed()
+    REQUEST_SECONDS.observe(elapsed, route)
+    REQUESTS.inc(1, route, str(status))
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        print("Slow request:", trace.describe())
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def tag(key, value):
+    # Attaches a label (e.g. the intent) to the current request's trace.
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tags[key] = value
@@ -0,0 +1,225 @@
+import os
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+from metrics import registry, span
+
+# --- Configurations ---
+SMTP_HOST = os.getenv("GRACE_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("GRACE_SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("GRACE_SMTP_SSL", "1") == "1"
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS", "")
+EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD", "")
+
+SMS_BACKEND = os.getenv("GRACE_SMS_BACKEND", "twilio")  # "twilio" or "http"
+SMS_HTTP_URL = os.getenv("GRACE_SMS_URL", "http://127.0.0.1:8002/sms")
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "")
+
+NOTIFY_WORKERS = int(os.getenv("GRACE_NOTIFY_WORKERS", "4"))
+
+NOTIFICATIONS = registry.counter("grace_notifications_total", "Notifications by channel and outcome.",
+                                 ("channel", "outcome"))
+
+
+class SMTPTransport:
+    # Keeps one logged-in SMTP session per worker thread and reuses it for
+    # every message, reconnecting if the server has dropped it.
+    # GRACE_SMTP_HOST=127.0.0.1 GRACE_SMTP_PORT=1025 GRACE_SMTP_SSL=0 points it
+    # at a local debugging server.
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_SSL,
+                 username=EMAIL_ADDRESS, password=EMAIL_APP_PASSWORD, timeout=10):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _server(self):
+        server = getattr(self._local, "server", None)
+        if server is None:
+            server = self._local.server = self._connect()
+        return server
+
+    def _reset(self):
+        server = getattr(self._local, "server", None)
+        self._local.server = None
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send(self, to_email, subject, body):
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = self.username
+        msg["To"] = to_email
+        try:
+            self._server().sendmail(self.username, to_email, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The kept-alive session went away; retry once on a fresh one.
+            self._reset()
+            self._server().sendmail(self.username, to_email, msg.as_string())
+
+    def close(self):
+        self._reset()
+
+
+class TwilioSMSTransport:
+    # One Twilio client (and its HTTP session) for the life of the process.
+
+    def __init__(self, account_sid=TWILIO_ACCOUNT_SID, auth_token=TWILIO_AUTH_TOKEN,
+                 from_number=TWILIO_FROM_NUMBER):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+
+    def send(self, to_number, message_body):
+        message = self._get_client().messages.create(body=message_body, from_=self.from_number, to=to_number)
+        return message.sid
+
+    def close(self):
+        pass
+
+
+class HTTPSMSTransport:
+    # Posts {"to", "body"} as JSON to an SMS gateway over a keep-alive session.
+    # Used with the stub endpoint in benchmarks/stub_notification_servers.py.
+
+    def __init__(self, url=SMS_HTTP_URL, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        import requests
+        self._session = requests.Session()
+
+    def send(self, to_number, message_body):
+        response = self._session.post(self.url, json={"to": to_number, "body": message_body},
+                                      timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("sid")
+
+    def close(self):
+        self._session.close()
+
+
+def create_sms_transport(backend=SMS_BACKEND):
+    if backend == "http":
+        return HTTPSMSTransport()
+    if backend == "twilio":
+        return TwilioSMSTransport()
+    raise ValueError(f"Unknown SMS backend: {backend}")
+
+
+class NotificationService:
+    # Sends email and SMS from a small worker pool so callers never wait on
+    # SMTP or the SMS gateway. email()/sms() return futures; the *_bulk
+    # variants split a batch across the workers so each chunk goes out over
+    # one kept-alive connection.
+
+    def __init__(self, email_transport=None, sms_transport=None, workers=NOTIFY_WORKERS):
+        self.email_transport = email_transport or SMTPTransport()
+        self.sms_transport = sms_transport or create_sms_transport()
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grace-notify")
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def _run(self, channel, send, *args):
+        with span(f"send_{channel}"):
+            try:
+                result = send(*args)
+            except Exception as e:
+                self._record(False)
+                NOTIFICATIONS.inc(1, channel, "failed")
+                print(f"Error sending notification via {channel}:", str(e))
+                raise
+        self._record(True)
+        NOTIFICATIONS.inc(1, channel, "sent")
+        return result
+
+    def send_email(self, to_email, subject, body):
+        # Synchronous send on the caller's thread; raises on failure.
+        return self._run("email", self.email_transport.send, to_email, subject, body)
+
+    def send_sms(self, to_number, message_body):
+        return self._run("sms", self.sms_transport.send, to_number, message_body)
+
+    def email(self, to_email, subject, body):
+        return self._executor.submit(self.send_email, to_email, subject, body)
+
+    def sms(self, to_number, message_body):
+        return self._executor.submit(self.send_sms, to_number, message_body)
+
+    def _send_chunk(self, send, chunk):
+        results = []
+        for args in chunk:
+            try:
+                results.append(send(*args))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _bulk(self, send, messages):
+        messages = list(messages)
+        size = -(-len(messages) // self.workers) or 1
+        futures = [self._executor.submit(self._send_chunk, send, messages[i:i + size])
+                   for i in range(0, len(messages), size)]
+        return [result for future in futures for result in future.result()]
+
+    def email_bulk(self, messages):
+        # messages: iterable of (to_email, subject, body); returns results/exceptions.
+        return self._bulk(self.send_email, messages)
+
+    def sms_bulk(self, messages):
+        # messages: iterable of (to_number, message_body)
+        return self._bulk(self.send_sms, messages)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.email_transport.close()
+        self.sms_transport.close()
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = NotificationService()
+    return _notifier
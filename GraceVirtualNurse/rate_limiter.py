@@ -0,0 +1,120 @@
+import math
+import os
+import threading
+import time
+
+from db import get_pool
+from metrics import registry
+from session_store import SESSION_DB_PATH
+
+# --- Configurations ---
+RATE_LIMIT_PER_MINUTE = float(os.getenv("GRACE_RATE_LIMIT_PER_MINUTE", "60"))  # per bucket; 0 disables
+RATE_LIMIT_BURST = int(os.getenv("GRACE_RATE_LIMIT_BURST", "20"))
+# Cap per client address across all of its sessions; several patients may share one address.
+RATE_LIMIT_ADDRESS_PER_MINUTE = float(os.getenv("GRACE_RATE_LIMIT_ADDRESS_PER_MINUTE",
+                                                str(RATE_LIMIT_PER_MINUTE * 5)))
+RATE_LIMIT_ADDRESS_BURST = int(os.getenv("GRACE_RATE_LIMIT_ADDRESS_BURST", str(RATE_LIMIT_BURST * 5)))
+RATE_LIMIT_BACKEND = os.getenv("GRACE_RATE_LIMIT_BACKEND", "memory")  # "memory" or "sqlite"
+PURGE_EVERY = 1000  # requests between sweeps of idle buckets
+
+RATE_LIMITED = registry.counter("grace_rate_limited_total", "Requests refused by the rate limiter.")
+
+CREATE_RATE_LIMITS = '''CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+)'''
+# Token bucket in one statement: refill for the time since the last request,
+# cap at the burst, and take a token only if one is there. A refused request
+# leaves the row alone, so rowcount tells the caller the outcome.
+TAKE_TOKEN = (
+    "INSERT INTO rate_limits (key, tokens, updated_at) VALUES (:key, :burst - 1, :now) "
+    "ON CONFLICT(key) DO UPDATE SET "
+    "tokens = MIN(:burst, tokens + (:now - updated_at) * :rate) - 1, updated_at = :now "
+    "WHERE MIN(:burst, tokens + (:now - updated_at) * :rate) >= 1"
+)
+SELECT_TOKENS = "SELECT MIN(:burst, tokens + (:now - updated_at) * :rate) FROM rate_limits WHERE key = :key"
+# A bucket idle long enough to be full again is the same as no bucket.
+PURGE_IDLE = "DELETE FROM rate_limits WHERE updated_at < ?"
+
+
+class InMemoryRateLimiter:
+    # Token bucket per key for a single process.
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    def _take(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._requests += 1
+            if self._requests % PURGE_EVERY == 0:
+                idle = now - self.burst / self.rate
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= idle}
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False, (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0.0
+
+    def acquire(self, key):
+        # Returns (allowed, seconds until the next token when refused).
+        allowed, retry_after = self._take(key)
+        if not allowed:
+            RATE_LIMITED.inc()
+        return allowed, retry_after
+
+    def wait(self, key):
+        # Blocks until a token is available, for callers that pace work rather than refuse it.
+        while True:
+            allowed, retry_after = self._take(key)
+            if allowed:
+                return
+            time.sleep(retry_after)
+
+
+class SQLiteRateLimiter:
+    # The same buckets in the shared local database, so the limit holds for a
+    # patient no matter which worker process serves each request.
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, path=SESSION_DB_PATH):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._pool = get_pool(path)
+        self._requests = 0
+        with self._pool.connection() as conn:
+            conn.execute(CREATE_RATE_LIMITS)
+
+    def acquire(self, key):
+        now = time.time()
+        params = {"key": key, "burst": self.burst, "rate": self.rate, "now": now}
+        self._requests += 1
+        if self._requests % PURGE_EVERY == 0:
+            self._pool.execute(PURGE_IDLE, (now - self.burst / self.rate,))
+        if self._pool.execute(TAKE_TOKEN, params) == 1:
+            return True, 0.0
+        RATE_LIMITED.inc()
+        row = self._pool.query_one(SELECT_TOKENS, params)
+        tokens = row[0] if row else 0.0
+        return False, max(0.0, (1 - tokens) / self.rate)
+
+
+def create_rate_limiter(backend=RATE_LIMIT_BACKEND, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST):
+    # None when rate limiting is switched off.
+    if per_minute <= 0:
+        return None
+    if backend == "sqlite":
+        return SQLiteRateLimiter(per_minute, burst)
+    if backend == "memory":
+        return InMemoryRateLimiter(per_minute, burst)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from db import get_pool
+from medication_reminder import DEFAULT_DOSE_TIME, get_dose_schedule, parse_dose_times
+from rate_limiter import InMemoryRateLimiter
+
+# --- Configurations ---
+REMINDER_WORKERS = int(os.getenv("GRACE_REMINDER_WORKERS", "4"))
+REMINDER_RATE_PER_SECOND = float(os.getenv("GRACE_REMINDER_RATE", "5"))
+REMINDER_BATCH_SIZE = int(os.getenv("GRACE_REMINDER_BATCH_SIZE", "50"))  # doses per dispatch call
+REMINDER_MAX_ATTEMPTS = int(os.getenv("GRACE_REMINDER_MAX_ATTEMPTS", "3"))
+REMINDER_RETRY_SECONDS = float(os.getenv("GRACE_REMINDER_RETRY_SECONDS", "60"))
+REMINDER_REFRESH_SECONDS = float(os.getenv("GRACE_REMINDER_REFRESH_SECONDS", "300"))
+# Doses missed by up to this long (e.g. during a restart) are still sent.
+REMINDER_CATCH_UP = timedelta(minutes=int(os.getenv("GRACE_REMINDER_CATCH_UP_MINUTES", "60")))
+# A claim older than this with no result is treated as abandoned by a crashed process.
+REMINDER_CLAIM_LEASE_SECONDS = 300
+
+Reminder = namedtuple("Reminder", [
+    "medication_id", "due_at", "name", "dosage", "patient_id", "patient_name", "email", "phone",
+])
+
+CLAIM_DISPATCH = (
+    "INSERT OR IGNORE INTO reminder_dispatches "
+    "(medication_id, due_at, status, attempts, claimed_by, claimed_at) VALUES (?, ?, 'claimed', 0, ?, ?)"
+)
+# Compare-and-set takeover of a dose that is waiting for a retry or whose claim went stale.
+RECLAIM_DISPATCH = (
+    "UPDATE reminder_dispatches SET status = 'claimed', claimed_by = ?, claimed_at = ? "
+    "WHERE medication_id = ? AND due_at = ? AND ("
+    "(status = 'retry' AND next_attempt_at <= ?) OR (status = 'claimed' AND claimed_at < ?))"
+)
+MARK_SENT = (
+    "UPDATE reminder_dispatches SET status = 'sent', attempts = attempts + 1, delivered = ? "
+    "WHERE medication_id = ? AND due_at = ?"
+)
+MARK_RETRY = (
+    "UPDATE reminder_dispatches SET status = ?, attempts = attempts + 1, next_attempt_at = ?, delivered = ? "
+    "WHERE medication_id = ? AND due_at = ?"
+)
+SELECT_ATTEMPTS = "SELECT attempts, delivered FROM reminder_dispatches WHERE medication_id = ? AND due_at = ?"
+SELECT_SETTLED = (
+    "SELECT medication_id, due_at FROM reminder_dispatches "
+    "WHERE due_at >= ? AND status IN ('sent', 'failed')"
+)
+
+
+def reminder_message(reminder):
+    at = reminder.due_at.strftime("%I:%M %p").lstrip("0")
+    return f"Grace Medication Reminder: please take {reminder.dosage} of {reminder.name} at {at}."
+
+
+class ReminderEngine:
+    # Computes each patient's dose times from the medications table and keeps
+    # the upcoming ones in a min-heap ordered by due time. A single loop thread
+    # pops due doses, claims them in reminder_dispatches and hands them to a
+    # worker pool in batches of up to batch_size. The worker paces the batch
+    # through the rate limit and calls dispatch([(reminder, delivered), ...]),
+    # which returns one exception (or None) per dose; failures are retried with
+    # exponential backoff. delivered is the set of channels ("email", "sms",
+    # ...) the dose already went out on: dispatch skips those and adds each
+    # channel it sends. The set is stored with the dose, so a retry (in this
+    # process or another) resends only the channels that failed.
+    #
+    # Claims go through the reminder_dispatches primary key, so a dose is sent
+    # once across restarts and across every process sharing the database.
+
+    def __init__(self, dispatch, workers=REMINDER_WORKERS, rate_per_second=REMINDER_RATE_PER_SECOND,
+                 max_attempts=REMINDER_MAX_ATTEMPTS, retry_seconds=REMINDER_RETRY_SECONDS,
+                 refresh_seconds=REMINDER_REFRESH_SECONDS, horizon=timedelta(days=1), pool=None,
+                 batch_size=REMINDER_BATCH_SIZE):
+        self.dispatch = dispatch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.refresh_seconds = refresh_seconds
+        self.horizon = horizon
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool = pool
+        self._limiter = InMemoryRateLimiter(per_minute=rate_per_second * 60, burst=max(1.0, rate_per_second))
+        self._heap = []  # (due_at, sequence, reminder)
+        self._sequence = itertools.count()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._refresh_requested = False
+        self._thread = None
+        self._executor = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _db(self):
+        return self._pool or get_pool()
+
+    # --- Schedule ---
+    def _due_times(self, row, first_day, last_day):
+        (medication_id, name, dosage, start_date, end_date, dose_times, notes,
+         patient_id, patient_name, email, phone) = row
+        times = (dose_times.split(",") if dose_times else parse_dose_times(notes)) or [DEFAULT_DOSE_TIME]
+        day = max(first_day, date.fromisoformat(start_date))
+        last = min(last_day, date.fromisoformat(end_date))
+        while day <= last:
+            for dose_time in times:
+                hour, minute = map(int, dose_time.split(":"))
+                due_at = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+                yield Reminder(medication_id, due_at, name, dosage, patient_id, patient_name, email, phone)
+            day += timedelta(days=1)
+
+    def refresh(self, now=None):
+        # Loads every dose due between now - catch-up and now + horizon that has
+        # not already been sent, and pushes the new ones onto the heap.
+        now = now or datetime.now()
+        window_start, window_end = now - REMINDER_CATCH_UP, now + self.horizon
+        settled = {(mid, due) for mid, due in self._db().query(SELECT_SETTLED, (window_start.isoformat(),))}
+        added = 0
+        with self._lock:
+            for row in get_dose_schedule(window_start.date(), window_end.date()):
+                for reminder in self._due_times(row, window_start.date(), window_end.date()):
+                    key = (reminder.medication_id, reminder.due_at.isoformat())
+                    if not window_start <= reminder.due_at <= window_end:
+                        continue
+                    if key in settled or key in self._queued:
+                        continue
+                    self._queued.add(key)
+                    self._push(reminder.due_at, reminder)
+                    added += 1
+        if added:
+            self._wakeup.set()
+        return added
+
+    def _push(self, due_at, reminder):
+        # Caller holds self._lock.
+        heapq.heappush(self._heap, (due_at, next(self._sequence), reminder))
+
+    def wake(self):
+        # Call after adding medications so new doses are picked up right away.
+        self._refresh_requested = True
+        self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._heap)
+
+    # --- Dispatch ---
+    def _claim(self, reminder):
+        key = (reminder.medication_id, reminder.due_at.isoformat())
+        now = time.time()
+        with self._db().connection() as conn:
+            if conn.execute(CLAIM_DISPATCH, key + (self.node_id, now)).rowcount:
+                return True
+            return conn.execute(
+                RECLAIM_DISPATCH,
+                (self.node_id, now) + key + (now, now - REMINDER_CLAIM_LEASE_SECONDS)
+            ).rowcount == 1
+
+    def _deliver(self, reminders):
+        batch, attempts = [], []
+        for reminder in reminders:
+            key = (reminder.medication_id, reminder.due_at.isoformat())
+            tries, delivered = self._db().query_one(SELECT_ATTEMPTS, key)
+            self._limiter.wait("dispatch")
+            batch.append((reminder, set(filter(None, delivered.split(",")))))
+            attempts.append(tries)
+        try:
+            errors = self.dispatch(batch)
+        except Exception as e:
+            errors = [e] * len(batch)
+        for (reminder, delivered), tries, error in zip(batch, attempts, errors):
+            self._settle(reminder, delivered, tries, error)
+
+    def _settle(self, reminder, delivered, attempts, error):
+        key = (reminder.medication_id, reminder.due_at.isoformat())
+        if error is not None:
+            attempts += 1
+            done = ",".join(sorted(delivered))
+            if attempts >= self.max_attempts:
+                self._db().execute(MARK_RETRY, ("failed", None, done) + key)
+                with self._lock:
+                    self.failed += 1
+                    self._queued.discard(key)
+                print(f"Giving up on reminder {key} after {attempts} attempts:", str(error))
+                return
+            delay = self.retry_seconds * (2 ** (attempts - 1))
+            self._db().execute(MARK_RETRY, ("retry", time.time() + delay, done) + key)
+            with self._lock:
+                self.retried += 1
+                self._push(datetime.now() + timedelta(seconds=delay), reminder)
+            self._wakeup.set()
+            return
+        self._db().execute(MARK_SENT, (",".join(sorted(delivered)),) + key)
+        with self._lock:
+            self.sent += 1
+            self._queued.discard(key)
+
+    def run_due(self, now=None):
+        # Claims and submits every dose that is due; returns how many were submitted.
+        now = now or datetime.now()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+        claimed = []
+        for reminder in due:
+            if self._claim(reminder):
+                claimed.append(reminder)
+            else:
+                with self._lock:
+                    self._queued.discard((reminder.medication_id, reminder.due_at.isoformat()))
+        for start in range(0, len(claimed), self.batch_size):
+            batch = claimed[start:start + self.batch_size]
+            if self._executor is None:
+                self._deliver(batch)  # not started: deliver inline
+            else:
+                self._executor.submit(self._deliver, batch)
+        return len(claimed)
+
+    def _seconds_until_next(self):
+        with self._lock:
+            if not self._heap:
+                return self.refresh_seconds
+            return max(0.0, (self._heap[0][0] - datetime.now()).total_seconds())
+
+    def _run(self):
+        next_refresh = 0.0
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_refresh or self._refresh_requested:
+                self._refresh_requested = False
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("Error loading medication reminders:", str(e))
+                next_refresh = time.monotonic() + self.refresh_seconds
+            try:
+                self.run_due()
+            except Exception as e:
+                print("Error dispatching medication reminders:", str(e))
+            timeout = min(self._seconds_until_next(), max(0.0, next_refresh - time.monotonic()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="grace-reminder")
+            self._thread = threading.Thread(target=self._run, name="grace-reminder-engine", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
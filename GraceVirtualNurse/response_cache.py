@@ -0,0 +1,96 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# --- Configurations ---
+CACHE_TTL_SECONDS = float(os.getenv("GRACE_CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("GRACE_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("GRACE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_slot(value):
+    # "  I have a Headache!! " -> "i have a headache"
+    value = _NON_WORD.sub(" ", str(value).lower())
+    return _SPACES.sub(" ", value).strip()
+
+
+def cache_key(template, *slots):
+    return (template,) + tuple(normalize_slot(slot) for slot in slots)
+
+
+class ResponseCache:
+    # Thread-safe LRU cache for LLM replies with a TTL and a rough memory bound.
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(key, value):
+        return sys.getsizeof(value) + sum(sys.getsizeof(part) for part in key)
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+response_cache = ResponseCache()
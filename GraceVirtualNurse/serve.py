@@ -0,0 +1,149 @@
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import sys
+
+# --- Configurations ---
+SERVE_HOST = os.getenv("GRACE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("GRACE_PORT", "5000"))
+SERVE_WORKERS = int(os.getenv("GRACE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_THREADS = int(os.getenv("GRACE_THREADS", "8"))  # per worker, gunicorn only
+
+# Production entry point: several worker processes, each building its own app
+# with create_app() after the fork, so no SQLite connection, HTTP session or
+# thread is shared across processes.
+#   python serve.py --workers 4
+# With more than one worker, patient sessions and rate limits default to the
+# shared SQLite store, and the scheduler lock file picks the single process
+# that runs the reminder engine. Uses gunicorn's gthread workers when gunicorn
+# is installed; otherwise a built-in pre-fork server.
+
+
+def use_shared_state(workers):
+    # Must run before grace_chatbot_gui is imported: its stores read these at import.
+    if workers > 1:
+        for name in ("GRACE_SESSION_BACKEND", "GRACE_RATE_LIMIT_BACKEND"):
+            if os.environ.setdefault(name, "sqlite") != "sqlite":
+                print(f"Warning: {name}={os.environ[name]} keeps state per worker; "
+                      f"patients will see different state depending on the worker that answers.")
+
+
+def serve_gunicorn(host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class GraceApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("preload_app", False)  # build the app in each worker, after the fork
+
+        def load(self):
+            from grace_chatbot_gui import create_app
+            return create_app()
+
+    GraceApplication().run()
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(0)
+
+
+def run_worker(listener, host, port):
+    # In a forked child. Exiting through SystemExit lets atexit hooks flush the conversation log.
+    signal.signal(signal.SIGINT, _exit_on_signal)
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from grace_chatbot_gui import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    server = make_server(host, port, create_app(), threaded=True, request_handler=QuietHandler,
+                         fd=listener.fileno())
+    server.serve_forever()
+
+
+def serve_prefork(host, port, workers):
+    # The parent binds the socket once and forks the workers, which all accept
+    # on it; the kernel hands each connection to one of them. Workers that die
+    # are replaced; SIGINT/SIGTERM stop everything. Returns in the children,
+    # which then run the app.
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+    children = set()
+    stopping = False
+
+    def spawn():
+        # True in the new child.
+        pid = os.fork()
+        if pid == 0:
+            return True
+        children.add(pid)
+        return False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        if spawn():
+            return run_worker(listener, host, port)
+    print(f"Grace serving on http://{host}:{port} with {workers} workers (pre-fork)", flush=True)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited; starting a replacement", flush=True)
+            if spawn():
+                return run_worker(listener, host, port)
+    listener.close()
+
+
+def serve_single(host, port):
+    # Platforms without fork (Windows): one process, a thread per request.
+    from werkzeug.serving import make_server
+    from grace_chatbot_gui import create_app
+    print(f"Grace serving on http://{host}:{port} (single process; fork is not available here)", flush=True)
+    make_server(host, port, create_app(), threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run Grace with several worker processes")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS)
+    parser.add_argument("--server", choices=["auto", "gunicorn", "prefork"], default="auto")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    use_shared_state(args.workers)
+    server = args.server
+    if server == "auto":
+        server = "gunicorn" if importlib.util.find_spec("gunicorn") else "prefork"
+    if server == "gunicorn":
+        serve_gunicorn(args.host, args.port, args.workers, args.threads)
+    elif hasattr(os, "fork"):
+        serve_prefork(args.host, args.port, args.workers)
+    else:
+        serve_single(args.host, args.port)
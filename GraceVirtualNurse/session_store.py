@@ -0,0 +1,126 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from db import get_pool
+
+# --- Configurations ---
+SESSION_BACKEND = os.getenv("GRACE_SESSION_BACKEND", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("GRACE_SESSION_DB", "grace_sessions.db")
+SESSION_MAX = int(os.getenv("GRACE_SESSION_MAX", "10000"))
+SESSION_IDLE_SECONDS = float(os.getenv("GRACE_SESSION_IDLE_SECONDS", str(30 * 60)))
+
+DEFAULT_SESSION = {
+    "name": None,
+    "symptoms": [],
+    "last_topic": "",
+    "last_appointment": None,
+    "available_slots": [],
+    "slot_choices": [],
+    "held_slot": None,
+    "greeted": False
+}
+
+
+def new_session():
+    return copy.deepcopy(DEFAULT_SESSION)
+
+
+class InMemorySessionStore:
+    # Per-process LRU of session memories. Sessions idle for longer than
+    # idle_seconds are dropped, and the least recently used one is evicted
+    # once max_sessions is reached.
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_seconds=SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()  # session_id -> (last_seen, memory)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and now - entry[0] <= self.idle_seconds:
+                self._sessions.move_to_end(session_id)
+                return entry[1]
+        return new_session()
+
+    def __contains__(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry is not None and time.monotonic() - entry[0] <= self.idle_seconds
+
+    def save(self, session_id, memory):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (now, memory)
+            self._sessions.move_to_end(session_id)
+            while self._sessions:
+                oldest_id, (last_seen, _) = next(iter(self._sessions.items()))
+                if len(self._sessions) > self.max_sessions or now - last_seen > self.idle_seconds:
+                    del self._sessions[oldest_id]
+                else:
+                    break
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    # Sessions stored as JSON rows, so every worker process (or any node that
+    # shares the file) sees the same patient memory and restarts lose nothing.
+
+    def __init__(self, path=SESSION_DB_PATH, idle_seconds=SESSION_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._pool = get_pool(path)
+        self._saves = 0
+        with self._pool.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)")
+
+    def get(self, session_id):
+        row = self._pool.query_one(
+            "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+            (session_id, time.time() - self.idle_seconds)
+        )
+        return json.loads(row[0]) if row else new_session()
+
+    def __contains__(self, session_id):
+        return self._pool.query_one(
+            "SELECT 1 FROM sessions WHERE session_id = ? AND updated_at > ?",
+            (session_id, time.time() - self.idle_seconds)
+        ) is not None
+
+    def save(self, session_id, memory):
+        self._pool.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(memory), time.time())
+        )
+        self._saves += 1
+        if self._saves % 500 == 0:
+            self.purge_expired()
+
+    def delete(self, session_id):
+        self._pool.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self):
+        self._pool.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.idle_seconds,))
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "memory":
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown session backend: {backend}")
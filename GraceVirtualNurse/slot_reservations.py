@@ -0,0 +1,123 @@
+import os
+import time
+from datetime import timedelta
+from db import get_pool
+
+# --- Configurations ---
+HOLD_SECONDS = float(os.getenv("GRACE_SLOT_HOLD_SECONDS", "120"))
+# How long a confirmed slot may wait for its calendar event. A booking whose
+# process died before writing the event lapses after this and is offered again.
+BOOKING_SECONDS = float(os.getenv("GRACE_SLOT_BOOKING_SECONDS", "60"))
+PURGE_EVERY = 100  # holds between sweeps of expired rows
+
+CREATE_RESERVATIONS = '''CREATE TABLE IF NOT EXISTS slot_reservations (
+    calendar_id TEXT NOT NULL,
+    slot_start TEXT NOT NULL,
+    status TEXT NOT NULL,
+    holder TEXT NOT NULL,
+    expires_at REAL,
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (calendar_id, slot_start)
+)'''
+# A slot can be held when nobody has it, when the previous hold or booking has
+# lapsed, or when the same holder asks again (which extends the hold). Confirmed
+# rows never match the WHERE, so a confirmed slot cannot be taken over.
+HOLD_SLOT = (
+    "INSERT INTO slot_reservations (calendar_id, slot_start, status, holder, expires_at) "
+    "VALUES (?, ?, 'held', ?, ?) "
+    "ON CONFLICT(calendar_id, slot_start) DO UPDATE SET "
+    "status = 'held', holder = excluded.holder, expires_at = excluded.expires_at, version = version + 1 "
+    "WHERE (status IN ('held', 'booking') AND expires_at < ?) "
+    "OR (status = 'held' AND holder = excluded.holder)"
+)
+SELECT_VERSION = "SELECT version FROM slot_reservations WHERE calendar_id = ? AND slot_start = ?"
+# Compare-and-set: only the holder that saw `version` can confirm, and only while
+# the hold is live. The slot then stays 'booking' until its event is written.
+CONFIRM_SLOT = (
+    "UPDATE slot_reservations SET status = 'booking', expires_at = ?, version = version + 1 "
+    "WHERE calendar_id = ? AND slot_start = ? AND holder = ? AND version = ? "
+    "AND status = 'held' AND expires_at >= ?"
+)
+COMPLETE_SLOT = (
+    "UPDATE slot_reservations SET status = 'confirmed', expires_at = NULL, version = version + 1 "
+    "WHERE calendar_id = ? AND slot_start = ? AND holder = ? AND status = 'booking'"
+)
+RELEASE_SLOT = (
+    "DELETE FROM slot_reservations "
+    "WHERE calendar_id = ? AND slot_start = ? AND holder = ? AND status = 'held'"
+)
+# Undoes a confirmation whose calendar insert failed, so the slot is offered again.
+CANCEL_SLOT = (
+    "DELETE FROM slot_reservations "
+    "WHERE calendar_id = ? AND slot_start = ? AND holder = ? AND status = 'booking'"
+)
+PURGE_EXPIRED = "DELETE FROM slot_reservations WHERE status IN ('held', 'booking') AND expires_at < ?"
+# Slots starting on a given day (slot_start is an ISO timestamp) that are confirmed, being booked or held.
+SELECT_TAKEN = (
+    "SELECT calendar_id, slot_start FROM slot_reservations "
+    "WHERE slot_start >= ? AND slot_start < ? AND (status = 'confirmed' OR expires_at >= ?)"
+)
+
+
+class SlotTaken(Exception):
+    # Result for a bulk booking whose slot is confirmed, being booked or held by someone else.
+    pass
+
+
+class SlotReservations:
+    # Short-lived holds on appointment slots, shared by every worker through
+    # the local database. A patient holds a slot while deciding, confirms the
+    # hold with the version it was given, writes the calendar event and then
+    # completes the booking; a second patient racing for the same slot either
+    # fails to hold it or fails the compare-and-set. Holds that are never
+    # confirmed lapse after hold_seconds. A confirmed hold is 'booking' until
+    # complete(): cancel() frees it when the calendar insert fails, and if the
+    # process dies in between it lapses after booking_seconds (keep that above
+    # the calendar client's timeout). An event that was written before the crash
+    # still shows up as busy in the availability index, so the lapsed row never
+    # lets the slot be offered twice.
+
+    def __init__(self, pool=None, hold_seconds=HOLD_SECONDS, booking_seconds=BOOKING_SECONDS):
+        self._pool = pool or get_pool()
+        self.hold_seconds = hold_seconds
+        self.booking_seconds = booking_seconds
+        self._holds = 0
+
+    def init(self):
+        with self._pool.connection() as conn:
+            conn.execute(CREATE_RESERVATIONS)
+
+    def hold(self, calendar_id, slot_start, holder):
+        # Returns the hold's version (pass it to confirm), or None if someone else has the slot.
+        now = time.time()
+        self._holds += 1
+        if self._holds % PURGE_EVERY == 0:
+            self.purge_expired(now)
+        with self._pool.connection() as conn:
+            cursor = conn.execute(HOLD_SLOT, (calendar_id, slot_start, holder, now + self.hold_seconds, now))
+            if cursor.rowcount != 1:
+                return None
+            return conn.execute(SELECT_VERSION, (calendar_id, slot_start)).fetchone()[0]
+
+    def confirm(self, calendar_id, slot_start, holder, version):
+        now = time.time()
+        return self._pool.execute(
+            CONFIRM_SLOT, (now + self.booking_seconds, calendar_id, slot_start, holder, version, now)) == 1
+
+    def complete(self, calendar_id, slot_start, holder):
+        # After the calendar event is written: the slot stays booked for good.
+        return self._pool.execute(COMPLETE_SLOT, (calendar_id, slot_start, holder)) == 1
+
+    def release(self, calendar_id, slot_start, holder):
+        return self._pool.execute(RELEASE_SLOT, (calendar_id, slot_start, holder)) == 1
+
+    def cancel(self, calendar_id, slot_start, holder):
+        return self._pool.execute(CANCEL_SLOT, (calendar_id, slot_start, holder)) == 1
+
+    def purge_expired(self, now=None):
+        return self._pool.execute(PURGE_EXPIRED, (now or time.time(),))
+
+    def taken(self, day):
+        # {(calendar_id, slot_start), ...} confirmed, being booked or held on `day` (a date).
+        next_day = day + timedelta(days=1)
+        return set(self._pool.query(SELECT_TAKEN, (day.isoformat(), next_day.isoformat(), time.time())))
@@ -0,0 +1,185 @@
+import atexit
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+
+# --- Configurations ---
+TTS_RATE = int(os.getenv("GRACE_TTS_RATE", "135"))
+TTS_MAX_QUEUE = int(os.getenv("GRACE_TTS_MAX_QUEUE", "32"))
+# When set, utterances are rendered to <sha256>.wav here once and replayed from then on.
+TTS_CACHE_DIR = os.getenv("GRACE_TTS_CACHE_DIR", "")
+
+_STOP = object()
+
+
+def create_pyttsx3_engine(rate=TTS_RATE):
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty("rate", rate)
+    return engine
+
+
+def default_player():
+    # Returns a blocking play(path) for this platform, or None if there is no player.
+    if sys.platform == "win32":
+        import winsound
+        return lambda path: winsound.PlaySound(path, winsound.SND_FILENAME)
+    for command in ("afplay", "paplay", "aplay"):
+        if shutil.which(command):
+            return lambda path, command=command: subprocess.run(
+                [command, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return None
+
+
+class SpeechWorker:
+    # Text-to-speech on one background thread that owns a single long-lived
+    # engine (pyttsx3 engines must stay on the thread that created them).
+    # Callers only enqueue: say() returns straight away, and when the bounded
+    # queue is full the utterance is dropped and counted rather than blocking
+    # the caller. With a cache_dir, each distinct text is synthesized to a WAV
+    # file once and replayed afterwards, so recurring reminders cost a lookup.
+
+    def __init__(self, engine_factory=create_pyttsx3_engine, max_queue=TTS_MAX_QUEUE,
+                 cache_dir=TTS_CACHE_DIR, player=None, rate=TTS_RATE):
+        self.engine_factory = engine_factory
+        self.cache_dir = cache_dir or None
+        self.rate = rate
+        self.player = player if player is not None else (default_player() if self.cache_dir else None)
+        self._engine = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._closed = False
+        self.spoken = 0
+        self.rendered = 0
+        self.cache_hits = 0
+        self.dropped = 0
+        self.failed = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="grace-speech", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _count(self, name):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def cache_path(self, text):
+        digest = hashlib.sha256(f"{self.rate}\0{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.wav")
+
+    def _submit(self, kind, text):
+        future = Future()
+        if not self._closed:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait((kind, text, future))
+                return future
+            except queue.Full:
+                pass
+        self._count("dropped")
+        future.set_result(None)
+        return future
+
+    def say(self, text):
+        # Speaks text in the background; the future resolves to True once spoken, or None if dropped.
+        return self._submit("say", text)
+
+    def render(self, text):
+        # Future for the cached WAV path of text, synthesizing it only on a cache miss.
+        if not self.cache_dir:
+            raise ValueError("render() needs a cache_dir")
+        path = self.cache_path(text)
+        if os.path.exists(path):
+            self._count("cache_hits")
+            future = Future()
+            future.set_result(path)
+            return future
+        return self._submit("render", text)
+
+    # Everything below runs on the speech thread.
+
+    def _engine_instance(self):
+        if self._engine is None:
+            self._engine = self.engine_factory()
+        return self._engine
+
+    def _render(self, text):
+        path = self.cache_path(text)
+        if os.path.exists(path):
+            self._count("cache_hits")
+            return path
+        engine = self._engine_instance()
+        partial = f"{path[:-len('.wav')]}.{os.getpid()}.partial.wav"
+        engine.save_to_file(text, partial)
+        engine.runAndWait()
+        os.replace(partial, path)
+        self._count("rendered")
+        return path
+
+    def _say(self, text):
+        if self.cache_dir and self.player:
+            self.player(self._render(text))
+        else:
+            engine = self._engine_instance()
+            engine.say(text)
+            engine.runAndWait()
+        self._count("spoken")
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            kind, text, future = item
+            try:
+                future.set_result(self._render(text) if kind == "render" else self._say(text))
+            except Exception as e:
+                self._count("failed")
+                print("Error in text-to-speech:", str(e))
+                future.set_exception(e)
+
+    def close(self, timeout=10):
+        # Finishes the queued utterances and stops the speech thread.
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "spoken": self.spoken,
+            "rendered": self.rendered,
+            "cache_hits": self.cache_hits,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+_speech_worker = None
+_speech_worker_lock = threading.Lock()
+
+
+def get_speech_worker():
+    global _speech_worker
+    if _speech_worker is None:
+        with _speech_worker_lock:
+            if _speech_worker is None:
+                _speech_worker = SpeechWorker()
+    return _speech_worker
@@ -0,0 +1,335 @@
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configurations ---
+SPEECH_BACKEND = os.getenv("GRACE_SPEECH_BACKEND", "google")  # "google" or "vosk" (offline)
+VOSK_MODEL_PATH = os.getenv("GRACE_VOSK_MODEL", "vosk-model-small-en-us")
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+VAD_MIN_ENERGY = float(os.getenv("GRACE_VAD_MIN_ENERGY", "300"))  # RMS of 16-bit samples
+VAD_NOISE_RATIO = 3.0   # speech must be this much louder than the running noise floor
+VAD_START_MS = 90       # voiced audio needed to open an utterance
+VAD_END_MS = 500        # silence that closes it
+CHUNK_SECONDS = 1.5     # audio per incremental recognition request (chunked backends)
+MAX_UTTERANCE_SECONDS = 30
+RECOGNITION_WORKERS = 4  # concurrent chunk requests, shared by every chunked backend in the process
+
+# Audio moves through the pipeline as frames of 16-bit mono PCM bytes.
+
+
+def _mono(samples, channels):
+    return samples if channels == 1 else samples[::channels]
+
+
+class WavSource:
+    # Frames from a WAV file (path or file object). With realtime=True the
+    # frames are paced like a live microphone, which is what replay benchmarks want.
+
+    def __init__(self, wav, frame_ms=FRAME_MS, realtime=False):
+        self.wav = wav
+        self.frame_ms = frame_ms
+        self.realtime = realtime
+        with wave.open(wav, "rb") as reader:
+            self.sample_rate = reader.getframerate()
+            if reader.getsampwidth() != 2:
+                raise ValueError("WavSource needs 16-bit PCM audio")
+        if hasattr(wav, "seek"):
+            wav.seek(0)
+
+    def __iter__(self):
+        frame_samples = self.sample_rate * self.frame_ms // 1000
+        started = time.perf_counter()
+        with wave.open(self.wav, "rb") as reader:
+            channels = reader.getnchannels()
+            for index in range(reader.getnframes() // frame_samples):
+                samples = array("h", reader.readframes(frame_samples))
+                if self.realtime:
+                    delay = started + (index + 1) * self.frame_ms / 1000 - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield _mono(samples, channels).tobytes()
+
+
+class PCMStreamSource:
+    # Frames from a raw 16-bit mono PCM stream (a socket file, a pipe, stdin.buffer).
+
+    def __init__(self, stream, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+
+    def __iter__(self):
+        frame_bytes = self.sample_rate * self.frame_ms // 1000 * 2
+        while True:
+            frame = self.stream.read(frame_bytes)
+            if len(frame) < frame_bytes:
+                return
+            yield frame
+
+
+class MicrophoneSource:
+    # Frames from the default (or given) input device through PyAudio.
+
+    def __init__(self, device_index=None, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS,
+                 max_seconds=MAX_UTTERANCE_SECONDS):
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.max_seconds = max_seconds
+
+    def __iter__(self):
+        import speech_recognition as sr
+        frame_samples = self.sample_rate * self.frame_ms // 1000
+        with sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate,
+                           chunk_size=frame_samples) as microphone:
+            for _ in range(self.max_seconds * 1000 // self.frame_ms):
+                yield microphone.stream.read(frame_samples)
+
+
+class EnergyVAD:
+    # Voice activity from frame energy against an adaptive noise floor, the
+    # same idea as speech_recognition's dynamic energy threshold.
+
+    def __init__(self, min_energy=VAD_MIN_ENERGY, noise_ratio=VAD_NOISE_RATIO, frame_ms=FRAME_MS,
+                 start_ms=VAD_START_MS, end_ms=VAD_END_MS):
+        self.min_energy = min_energy
+        self.noise_ratio = noise_ratio
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_ms // frame_ms)
+        self.noise_floor = min_energy / noise_ratio
+
+    @staticmethod
+    def energy(frame):
+        samples = array("h", frame)
+        if not samples:
+            return 0.0
+        return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+    def is_speech(self, frame):
+        energy = self.energy(frame)
+        voiced = energy > max(self.min_energy, self.noise_floor * self.noise_ratio)
+        if not voiced:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        return voiced
+
+
+class VoskBackend:
+    # Offline recognition with a local Vosk model. It is truly streaming: every
+    # frame goes straight into the recognizer, which reports partial text.
+
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, model_path=VOSK_MODEL_PATH, sample_rate=SAMPLE_RATE):
+        self.model_path = model_path
+        self.sample_rate = sample_rate
+        self._recognizer = None
+        self._done = []
+
+    def _model(self):
+        from vosk import Model
+        with self._models_lock:
+            if self.model_path not in self._models:
+                self._models[self.model_path] = Model(self.model_path)
+            return self._models[self.model_path]
+
+    def start(self):
+        from vosk import KaldiRecognizer
+        self._recognizer = KaldiRecognizer(self._model(), self.sample_rate)
+        self._done = []
+
+    def accept(self, frame, voiced=True):
+        if self._recognizer.AcceptWaveform(frame):
+            self._done.append(json.loads(self._recognizer.Result()).get("text", ""))
+            pending = ""
+        else:
+            pending = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        return " ".join(part for part in self._done + [pending] if part)
+
+    def finish(self):
+        self._done.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        return " ".join(part for part in self._done if part)
+
+
+def recognize_google(pcm, sample_rate, language="en-US"):
+    import speech_recognition as sr
+    try:
+        return sr.Recognizer().recognize_google(sr.AudioData(pcm, sample_rate, 2), language=language)
+    except sr.UnknownValueError:
+        return ""
+
+
+_recognition_executor = None
+_recognition_lock = threading.Lock()
+
+
+def get_recognition_executor():
+    # One pool for the process: listen_to_user() builds a backend per utterance.
+    global _recognition_executor
+    if _recognition_executor is None:
+        with _recognition_lock:
+            if _recognition_executor is None:
+                _recognition_executor = ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS,
+                                                           thread_name_prefix="grace-asr")
+    return _recognition_executor
+
+
+class ChunkedBackend:
+    # For request/response recognizers such as the Google Web Speech API.
+    # Audio is cut into chunks of about chunk_seconds at a quiet frame and each
+    # chunk is recognized in the background while the patient keeps talking,
+    # so when the utterance ends only the last chunk is still outstanding.
+
+    def __init__(self, recognize=recognize_google, sample_rate=SAMPLE_RATE, chunk_seconds=CHUNK_SECONDS,
+                 executor=None):
+        self.recognize = recognize
+        self.sample_rate = sample_rate
+        self.chunk_bytes = int(chunk_seconds * sample_rate) * 2
+        self._executor = executor or get_recognition_executor()
+        self._buffer = bytearray()
+        self._chunks = []
+
+    def start(self):
+        self._buffer = bytearray()
+        self._chunks = []
+
+    def _flush(self):
+        if self._buffer:
+            self._chunks.append(self._executor.submit(self.recognize, bytes(self._buffer), self.sample_rate))
+            self._buffer = bytearray()
+
+    def accept(self, frame, voiced=True):
+        self._buffer += frame
+        # Cut at a pause when possible; never let a chunk grow past twice the target.
+        if len(self._buffer) >= self.chunk_bytes and (not voiced or len(self._buffer) >= 2 * self.chunk_bytes):
+            self._flush()
+        texts = []
+        for chunk in self._chunks:
+            if not chunk.done():
+                break
+            texts.append(chunk.result())
+        return " ".join(text for text in texts if text)
+
+    def finish(self):
+        self._flush()
+        return " ".join(text for text in (chunk.result() for chunk in self._chunks) if text)
+
+
+def create_speech_backend(name=SPEECH_BACKEND, sample_rate=SAMPLE_RATE):
+    if name == "vosk":
+        return VoskBackend(sample_rate=sample_rate)
+    if name == "google":
+        return ChunkedBackend(sample_rate=sample_rate)
+    raise ValueError(f"Unknown speech backend: {name}")
+
+
+class VoicePipeline:
+    # source -> VAD -> backend. Each utterance produces "partial" events as
+    # text firms up and one "final" event once the patient stops talking.
+
+    def __init__(self, source, backend, vad=None, on_partial=None, on_final=None):
+        self.source = source
+        self.backend = backend
+        self.vad = vad or EnergyVAD(frame_ms=getattr(source, "frame_ms", FRAME_MS))
+        self.on_partial = on_partial
+        self.on_final = on_final
+
+    def events(self):
+        # Yields (kind, text) with kind "partial" or "final".
+        preroll = deque(maxlen=self.vad.start_frames + 3)
+        in_speech = False
+        voiced_run = silent_run = 0
+        last_partial = ""
+        for frame in self.source:
+            voiced = self.vad.is_speech(frame)
+            if not in_speech:
+                preroll.append(frame)
+                voiced_run = voiced_run + 1 if voiced else 0
+                if voiced_run >= self.vad.start_frames:
+                    in_speech, silent_run, last_partial = True, 0, ""
+                    self.backend.start()
+                    for buffered in preroll:
+                        self.backend.accept(buffered, True)
+                    preroll.clear()
+                continue
+
+            partial = self.backend.accept(frame, voiced)
+            if partial and partial != last_partial:
+                last_partial = partial
+                yield self._emit("partial", partial)
+            silent_run = 0 if voiced else silent_run + 1
+            if silent_run >= self.vad.end_frames:
+                in_speech, voiced_run = False, 0
+                yield self._emit("final", self.backend.finish())
+        if in_speech:
+            yield self._emit("final", self.backend.finish())
+
+    def _emit(self, kind, text):
+        callback = self.on_partial if kind == "partial" else self.on_final
+        if callback:
+            callback(text)
+        return kind, text
+
+    def listen(self):
+        # The first complete utterance, or "" if the source ends first.
+        for kind, text in self.events():
+            if kind == "final":
+                return text
+        return ""
+
+
+class ChatForwarder:
+    # Sends transcripts to /chat: partials as {"partial": true} previews (only
+    # the newest is kept while one is in flight), finals as normal messages.
+
+    def __init__(self, url, session_id):
+        import requests
+        self.url = url
+        self.session_id = session_id
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grace-voice-chat")
+        self._partial_in_flight = None
+
+    def _post(self, text, partial):
+        response = self._session.post(self.url, json={"message": text, "partial": partial,
+                                                      "session_id": self.session_id}, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def partial(self, text):
+        if self._partial_in_flight is None or self._partial_in_flight.done():
+            self._partial_in_flight = self._executor.submit(self._post, text, True)
+
+    def final(self, text):
+        return self._executor.submit(self._post, text, False)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream speech into Grace's /chat endpoint")
+    parser.add_argument("--wav", help="replay a 16-bit WAV file instead of the microphone")
+    parser.add_argument("--backend", default=SPEECH_BACKEND, choices=["google", "vosk"])
+    parser.add_argument("--chat-url", default="http://127.0.0.1:5000/chat")
+    parser.add_argument("--session-id", default="voice")
+    args = parser.parse_args()
+
+    source = WavSource(args.wav, realtime=True) if args.wav else MicrophoneSource()
+    forwarder = ChatForwarder(args.chat_url, args.session_id)
+    pipeline = VoicePipeline(source, create_speech_backend(args.backend, source.sample_rate),
+                             on_partial=forwarder.partial)
+    for kind, text in pipeline.events():
+        print(f"[{kind}] {text}")
+        if kind == "final" and text:
+            print("Grace:", forwarder.final(text).result().get("response"))
+    forwarder.close()